@@ -1,20 +1,182 @@
 #!/usr/bin/env python3
 
-from flask import request, make_response, abort
+import time
+from urllib.parse import urlencode
+
+from flask import current_app, request, make_response, abort, Response, stream_with_context
 from flask_restful import Resource
-from sqlalchemy import func
-from config import app, db, api
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
+from config import configure_app, db, api
+
+from models import Game, Store, Listing, Job, child_deletes
+from pagination import paginate, parse_limit, parse_offset
+from params import (
+    query_number, query_flag, filter_games, filter_listings, apply_changes,
+    GAME_FIELDS, STORE_FIELDS, LISTING_FIELDS,
+)
+from search import search
+from changes import change_feed, compaction_horizon, latest_seq, stream_changes
+from geo import nearby_stores, current_minute, DEFAULT_RADIUS_KM
+from inventory import catalog_stats, game_offers, store_inventory
+from history import DEFAULT_DAYS, game_price_trend, listing_history, parse_bucket
+from jobs import MAINTENANCE_JOBS, job_to_dict, submit_job
+from serializers import fast_serializers, mixin_serializers, fast_row_serializers, mixin_row_serializers
+from versioning import conditional
+from caching import cached, depends_on, track
+from metrics import record_serialization
+from encoding import output_json
+import caching, changes, encoding, history, inventory, jobs, limits, metrics
+
+EXPORT_BATCH_SIZE = 1000
+INCLUDE_BATCH_SIZE = 500
 
-from models import Game, Store, Listing
+# ?include= names: the model, the listing column referencing it and its key
+# in the response's "included"
+LISTING_INCLUDES = {
+    'game': (Game, 'game_id', 'games'),
+    'store': (Store, 'store_id', 'stores'),
+}
 
-@app.route('/')
 def index():
     return '<h1>Project Server</h1>'
 
+
+def serializer(model, nested=True):
+    # Endpoints opt into the precompiled serializers through config.
+    # nested=False leaves out related rows (only their ids).
+    fast = request.endpoint in current_app.config['FAST_SERIALIZER_ENDPOINTS']
+    if nested:
+        serialize = fast_serializers[model] if fast else mixin_serializers[model]
+    else:
+        serialize = fast_row_serializers[model] if fast else mixin_row_serializers[model]
+
+    def tracked(obj):
+        start = time.perf_counter()
+        track(obj)
+        data = serialize(obj)
+        record_serialization(time.perf_counter() - start)
+        return data
+    return tracked
+
+
+def listing_query():
+    # Load the nested game and store in the same SELECT instead of one per row
+    return Listing.query.options(joinedload(Listing.game), joinedload(Listing.store))
+
+
+def collection_response(query, columns, serialize, render=None):
+    # Without limit/cursor the whole collection is returned, as before.
+    # render, if given, builds the body from the page of rows instead.
+    render = render or (lambda rows: [serialize(row) for row in rows])
+    if "limit" not in request.args and "cursor" not in request.args:
+        rows = query.order_by(*columns).all()
+        return make_response(render(rows), 200)
+
+    limit = parse_limit(request.args.get("limit"))
+    rows, next_cursor = paginate(query, columns, limit, request.args.get("cursor"))
+    response = make_response(render(rows), 200)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        link_next_page(response, limit=limit, cursor=next_cursor)
+    return response
+
+
+def link_next_page(response, **args):
+    next_url = request.base_url + "?" + urlencode({**request.args.to_dict(), **args})
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+
+export_queries = {
+    'games': lambda: (Game, filter_games(Game.query, request.args)),
+    'stores': lambda: (Store, Store.query),
+    'listings': lambda: (Listing, filter_listings(listing_query(), request.args)),
+}
+
+
+def export_batches(query, model):
+    # Reads the table in id order one batch at a time instead of loading it.
+    # Keyset batches rather than yield_per, which can't be combined with the
+    # selectin loading of game consoles.
+    last_id = 0
+    while True:
+        rows = query.filter(model.id > last_id).order_by(model.id).limit(EXPORT_BATCH_SIZE).all()
+        yield from rows
+        if len(rows) < EXPORT_BATCH_SIZE:
+            return
+        last_id = rows[-1].id
+
+
+@conditional("games", "stores", "listings")
+def export(resource):
+    if resource not in export_queries:
+        return {'error': f'Cannot export {resource}'}, 404
+    output = request.args.get('format', 'json')
+    if output not in ('json', 'ndjson'):
+        return {'errors': 'format must be json or ndjson'}, 400
+    try:
+        model, query = export_queries[resource]()
+    except ValueError as e:
+        return {'errors': str(e)}, 400
+
+    serialize = fast_serializers[model]
+    rows = export_batches(query, model)
+
+    def encode(row):
+        return current_app.json.dumps(serialize(row), separators=(',', ':'))
+
+    def ndjson():
+        for row in rows:
+            yield encode(row) + '\n'
+
+    def array():
+        yield '['
+        for i, row in enumerate(rows):
+            yield (',' if i else '') + encode(row)
+        yield ']'
+
+    if output == 'ndjson':
+        return Response(stream_with_context(ndjson()), mimetype='application/x-ndjson')
+    return Response(stream_with_context(array()), mimetype='application/json')
+
+
+def compacted(horizon):
+    return {
+        'errors': 'Changes before this point were compacted; refetch the collections.',
+        'horizon': horizon,
+    }, 410
+
+
+def change_stream():
+    # A reconnecting EventSource sends the last id it saw in Last-Event-ID
+    cursor = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        since = query_number({"since": cursor}, "since") or 0
+    except ValueError as e:
+        return {'errors': str(e)}, 400
+    horizon = compaction_horizon()
+    if since < horizon:
+        return compacted(horizon)
+    return Response(
+        stream_with_context(stream_changes(since)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 class Games(Resource):
+    @conditional("games")
+    @cached("games", collection=True)
     def get(self):
-        games = [game.to_dict(rules=("-listings",)) for game in Game.query.all()]
-        return make_response(games, 200)
+        try:
+            return collection_response(
+                filter_games(Game.query, request.args),
+                (Game.id,),
+                serializer(Game),
+            )
+        except ValueError as e:
+            return {'errors': str(e)}, 400
 
     def post(self):
         json = request.get_json()
@@ -38,24 +200,24 @@ class Games(Resource):
           
 
 class GamesById(Resource):
+    @conditional("games")
+    @cached("games")
     def get(self, id):
         game = Game.query.filter(Game.id == id).first()
-        return make_response(game.to_dict(rules=("-listings",)), 200)
+        if not game:
+            return make_response({'error': 'Game not found'}, 404)
+        return make_response(serializer(Game)(game), 200)
 
     def patch(self, id):
         json = request.get_json()
-        game = Game.query.filter(Game.id == id).first()
+        game = db.session.get(Game, id)
         if game:
             try:
-                setattr(game, "title", json['title'])
-                setattr(game, "rating", json['rating'])
-                setattr(game, "console", json['console'])
-                setattr(game, "genre", json['genre'])
-                setattr(game, "image", json['image'])
-                db.session.add(game)
-                db.session.commit()
-                return make_response(game.to_dict(rules=("-listings",)), 202)
+                if apply_changes(game, json, GAME_FIELDS):
+                    db.session.commit()
+                return make_response(serializer(Game)(game), 202)
             except Exception as e:
+                db.session.rollback()
                 return make_response({"errors": "Failed to update game", "message": str(e)}, 400)
         else:
             return make_response({ "error": "Game not found"}, 400)
@@ -64,6 +226,8 @@ class GamesById(Resource):
         game = Game.query.filter(Game.id == id).first()
 
         if game:
+            for statement in child_deletes(game):
+                db.session.execute(statement)
             db.session.delete(game)
             db.session.commit()
             return {}, 204
@@ -72,9 +236,17 @@ class GamesById(Resource):
 
 
 class Stores(Resource):
+    @conditional("stores")
+    @cached("stores", collection=True)
     def get(self):
-        stores = [stores.to_dict(rules=("-listings",)) for stores in Store.query.all()]
-        return make_response(stores, 200)
+        try:
+            return collection_response(
+                Store.query,
+                (Store.id,),
+                serializer(Store),
+            )
+        except ValueError as e:
+            return {'errors': str(e)}, 400
 
     def post(self):
         json = request.get_json()
@@ -82,7 +254,9 @@ class Stores(Resource):
             new_store = Store(
                 name = json['name'],
                 location = json['location'],
-                hours = json['hours'] 
+                hours = json['hours'],
+                latitude = json.get('latitude'),
+                longitude = json.get('longitude'),
             )
             db.session.add(new_store)
             db.session.commit()
@@ -93,22 +267,24 @@ class Stores(Resource):
             return {"errors": "Failed to add store to database", 'message': str(e)}, 500
 
 class StoresById(Resource):
+    @conditional("stores")
+    @cached("stores")
     def get(self, id):
         store = Store.query.filter(Store.id == id).first()
-        return make_response(store.to_dict(rules=("-listings",)), 200)
+        if not store:
+            return make_response({'error': 'Store not found'}, 404)
+        return make_response(serializer(Store)(store), 200)
     
     def patch(self, id):
         json = request.get_json()
-        store = Store.query.filter(Store.id == id).first()
+        store = db.session.get(Store, id)
         if store:
             try:
-                setattr(store, "name", json['name'])
-                setattr(store, "location", json['location'])
-                setattr(store, "hours", json['hours'])
-                db.session.add(store)
-                db.session.commit()
-                return make_response(store.to_dict(rules=("-listings",)), 202)
+                if apply_changes(store, json, STORE_FIELDS):
+                    db.session.commit()
+                return make_response(serializer(Store)(store), 202)
             except ValueError:
+                db.session.rollback()
                 return make_response({'errors': ["validation errors"]}, 400)
         else:
             return make_response({ "error": "Store not found"}, 400)    
@@ -117,6 +293,8 @@ class StoresById(Resource):
         store = Store.query.filter(Store.id == id).first()
 
         if store:
+            for statement in child_deletes(store):
+                db.session.execute(statement)
             db.session.delete(store)
             db.session.commit()
             return {}, 204
@@ -124,10 +302,75 @@ class StoresById(Resource):
             return {'error': 'Store not found'}, 404
                 
 
+class StoresNearby(Resource):
+    # Not cached: with open_now the answer changes with the clock
+    def get(self):
+        try:
+            latitude = query_number(request.args, "lat", float)
+            longitude = query_number(request.args, "lon", float)
+            if latitude is None or longitude is None:
+                raise ValueError("lat and lon are required.")
+            radius = query_number(request.args, "radius", float)
+            minute = current_minute() if query_flag(request.args, "open_now") else None
+            game_id = query_number(request.args, "game_id")
+            limit = parse_limit(request.args.get("limit"))
+            if radius is None:
+                radius = DEFAULT_RADIUS_KM
+            stores = nearby_stores(latitude, longitude, radius, minute, game_id, limit)
+        except ValueError as e:
+            return {'errors': str(e)}, 400
+        serialize = serializer(Store)
+        return make_response(
+            [{**serialize(store), "distance_km": round(distance, 3)} for distance, store in stores], 200,
+        )
+
+
+def parse_include(args):
+    if "include" not in args:
+        return None
+    names = [name.strip() for name in args["include"].split(",") if name.strip()]
+    if any(name not in LISTING_INCLUDES for name in names):
+        raise ValueError(f"include must be a comma-separated list of {', '.join(LISTING_INCLUDES)}.")
+    return names
+
+
+def with_included(listings, include):
+    # Each referenced game and store is serialized once, keyed by id, and
+    # loaded with one query per batch of ids instead of joined to every row
+    included = {}
+    for name in include:
+        model, column, key = LISTING_INCLUDES[name]
+        ids = sorted({getattr(listing, column) for listing in listings} - {None})
+        serialize = serializer(model)
+        included[key] = {}
+        for start in range(0, len(ids), INCLUDE_BATCH_SIZE):
+            rows = model.query.filter(model.id.in_(ids[start:start + INCLUDE_BATCH_SIZE]))
+            included[key].update((str(row.id), serialize(row)) for row in rows)
+    serialize = serializer(Listing, nested=False)
+    return {'data': [serialize(listing) for listing in listings], 'included': included}
+
+
 class Listings(Resource):
+    @conditional("listings", "games", "stores")
+    @cached("listings", "games", "stores", collection=True)
     def get(self):
-        listings = [listings.to_dict() for listings in Listing.query.all()]
-        return make_response(listings, 200)
+        try:
+            include = parse_include(request.args)
+            if include is not None:
+                # ?include=game,store: listings with ids, related rows once
+                return collection_response(
+                    filter_listings(Listing.query, request.args),
+                    (Listing.created_at, Listing.id),
+                    None,
+                    render=lambda rows: with_included(rows, include),
+                )
+            return collection_response(
+                filter_listings(listing_query(), request.args),
+                (Listing.created_at, Listing.id),
+                serializer(Listing),
+            )
+        except ValueError as e:
+            return {'errors': str(e)}, 400
 
     def post(self):
         json = request.get_json()
@@ -152,29 +395,42 @@ class Listings(Resource):
             return {"errors": "Failed to add listing", 'message': str(e)}, 500
         
 class ListingsById(Resource):
+    @conditional("listings", "games", "stores")
+    @cached("listings", "games", "stores")
     def get(self, id):
-        listings = Listing.query.filter(Listing.id == id).first()
-        return make_response(listings.to_dict(), 200)
+        listing = listing_query().filter(Listing.id == id).first()
+        if not listing:
+            return make_response({'error': 'Listing not found'}, 404)
+        return make_response(serializer(Listing)(listing), 200)
 
     def patch(self, id):
         json = request.get_json()
-        listing = Listing.query.filter_by(id=id).first()
-        
-        if listing:
-            game = Game.query.get(json['game_id'])
-            store = Store.query.get(json['store_id'])
-            
-            if game:
-                listing.game = game
-            if store:
-                listing.store = store
-            
-            listing.condition = json['condition']
-            listing.stock = json['stock']
-            listing.price = json['price']
+        # Listing, game and store in one SELECT; they stay in the identity map
+        listing = listing_query().filter(Listing.id == id).first()
 
-            db.session.commit()
-            return make_response(listing.to_dict(), 202)
+        if listing:
+            try:
+                if isinstance(json, dict) and json.get("version", listing.version) != listing.version:
+                    return make_response(conflict(listing.version), 409)
+                changed = apply_changes(listing, json, ("condition", "stock", "price"))
+                # Parents are only looked up when the id actually changes;
+                # an unknown id keeps the current one
+                for field, model, relation in (("game_id", Game, "game"), ("store_id", Store, "store")):
+                    if field in json and json[field] != getattr(listing, field):
+                        parent = db.session.get(model, json[field])
+                        if parent:
+                            setattr(listing, relation, parent)
+                            changed = True
+                if changed:
+                    db.session.commit()
+            except ValueError as e:
+                db.session.rollback()
+                return {'errors': str(e)}, 400
+            except StaleDataError:
+                # Another request updated the row between our read and write
+                db.session.rollback()
+                return make_response(conflict(), 409)
+            return make_response(serializer(Listing)(listing), 202)
         else:
             return make_response({'error': 'Listing not found'}, 404)
 
@@ -189,12 +445,384 @@ class ListingsById(Resource):
             return {'error': 'Listing not found'}, 404
 
 
+def conflict(version=None):
+    body = {'errors': 'Listing was changed by another request; reload it and retry.'}
+    if version is not None:
+        body['version'] = version
+    return body
+
+
+def change_stock(id, delta):
+    # One conditional UPDATE without loading the row: concurrent requests
+    # can't oversell or overwrite each other's change. It goes through the
+    # ORM so the cache, table version, change log and summary hooks see it.
+    stock = Listing.stock + delta
+    return db.session.execute(
+        update(Listing)
+        .where(Listing.id == id, stock >= 0, stock <= 100)
+        .values(stock=stock, version=Listing.version + 1)
+        .returning(Listing.stock, Listing.version),
+        execution_options={"synchronize_session": False},
+    ).first()
+
+
+class ListingStock(Resource):
+    # POST /listings/<id>/reserve or /release with {"quantity": n} (default 1)
+    def post(self, id, action):
+        json = request.get_json(silent=True) or {}
+        quantity = json.get("quantity", 1) if isinstance(json, dict) else None
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            return {'errors': 'quantity must be a positive integer.'}, 400
+
+        row = change_stock(id, -quantity if action == "reserve" else quantity)
+        if row is None:
+            db.session.rollback()
+            stock = db.session.scalar(select(Listing.stock).where(Listing.id == id))
+            if stock is None:
+                return {'error': 'Listing not found'}, 404
+            if action == "reserve":
+                return {'errors': 'Not enough stock.', 'stock': stock}, 409
+            return {'errors': 'Stock can not exceed 100.', 'stock': stock}, 409
+        db.session.commit()
+        return make_response({'id': id, 'stock': row.stock, 'version': row.version}, 200)
+
+
+def bulk_body():
+    items = request.get_json()
+    if not isinstance(items, list):
+        raise ValueError("Request body must be a JSON array.")
+    return items
+
+
+def is_id(value):
+    # JSON true/false arrive as bool, a subclass of int
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def existing_ids(model, ids):
+    ids = {id for id in ids if is_id(id)}
+    if not ids:
+        return set()
+    return {id for (id,) in db.session.query(model.id).filter(model.id.in_(ids))}
+
+
+def listing_versions(ids):
+    ids = {id for id in ids if is_id(id)}
+    if not ids:
+        return {}
+    return dict(db.session.execute(select(Listing.id, Listing.version).where(Listing.id.in_(ids))).all())
+
+
+def validate_listing_fields(item, fields):
+    # A transient Listing runs the @validates hooks and normalizes the values
+    # without touching the session
+    if not isinstance(item, dict):
+        raise ValueError("Each item must be a JSON object.")
+    values = {key: item[key] for key in fields if key in item}
+    validated = Listing(**values)
+    return {key: getattr(validated, key) for key in values}
+
+
+def job_accepted(job, **extra):
+    response = make_response({**job_to_dict(job), **extra}, 202)
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return response
+
+
+class ListingsBulk(Resource):
+    def post(self):
+        try:
+            items = bulk_body()
+            atomic = query_flag(request.args, "atomic") is not False
+            background = query_flag(request.args, "background")
+        except ValueError as e:
+            return {'errors': str(e)}, 400
+
+        game_ids = existing_ids(Game, (item.get("game_id") for item in items if isinstance(item, dict)))
+        store_ids = existing_ids(Store, (item.get("store_id") for item in items if isinstance(item, dict)))
+
+        rows, errors = [], []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append({'index': index, 'error': "Each item must be a JSON object."})
+                continue
+            try:
+                missing = [key for key in LISTING_FIELDS if key not in item]
+                if missing:
+                    raise ValueError(f"Missing fields: {', '.join(missing)}")
+                values = validate_listing_fields(item, LISTING_FIELDS)
+                if values["game_id"] not in game_ids or values["store_id"] not in store_ids:
+                    raise ValueError("Game or Store not found")
+                rows.append(values)
+            except (ValueError, TypeError) as e:
+                errors.append({'index': index, 'error': str(e)})
+
+        if errors and atomic:
+            return make_response({'errors': errors}, 400)
+        if background and rows:
+            return job_accepted(submit_job("import-listings", {"rows": rows}), errors=errors)
+
+        try:
+            # One multi-row INSERT per batch instead of one per listing
+            created = db.session.scalars(insert(Listing).returning(Listing.id), rows).all() if rows else []
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return {"errors": "Failed to add listings", 'message': str(e)}, 500
+        return make_response({'created': created, 'errors': errors}, 201)
+
+    def patch(self):
+        try:
+            items = bulk_body()
+            atomic = query_flag(request.args, "atomic") is not False
+        except ValueError as e:
+            return {'errors': str(e)}, 400
+
+        items = [item if isinstance(item, dict) else {} for item in items]
+        versions = listing_versions(item.get("id") for item in items)
+        game_ids = existing_ids(Game, (item.get("game_id") for item in items))
+        store_ids = existing_ids(Store, (item.get("store_id") for item in items))
+
+        rows, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                if not is_id(item.get("id")) or item["id"] not in versions:
+                    raise ValueError("Listing not found")
+                if item.get("version", versions[item["id"]]) != versions[item["id"]]:
+                    raise ValueError("Listing was changed by another request; reload it and retry.")
+                values = validate_listing_fields(item, LISTING_FIELDS)
+                if "game_id" in values and values["game_id"] not in game_ids:
+                    raise ValueError("Game not found")
+                if "store_id" in values and values["store_id"] not in store_ids:
+                    raise ValueError("Store not found")
+                # The version is checked and bumped by the UPDATE itself
+                rows.append({"id": item["id"], "version": versions[item["id"]], **values})
+            except (ValueError, TypeError) as e:
+                errors.append({'index': index, 'error': str(e)})
+
+        if errors and atomic:
+            return make_response({'errors': errors}, 400)
+
+        try:
+            # UPDATE ... WHERE id = ? executed once per distinct set of changed fields
+            if rows:
+                db.session.execute(update(Listing), rows)
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return make_response(conflict(), 409)
+        except Exception as e:
+            db.session.rollback()
+            return {"errors": "Failed to update listings", 'message': str(e)}, 500
+        return make_response({'updated': [row["id"] for row in rows], 'errors': errors}, 202)
+
+    def delete(self):
+        try:
+            ids = bulk_body()
+            atomic = query_flag(request.args, "atomic") is not False
+        except ValueError as e:
+            return {'errors': str(e)}, 400
+
+        listing_ids = existing_ids(Listing, ids)
+        errors = [
+            {'index': index, 'error': 'Listing not found'}
+            for index, id in enumerate(ids)
+            if not is_id(id) or id not in listing_ids
+        ]
+        if errors and atomic:
+            return make_response({'errors': errors}, 400)
+
+        if listing_ids:
+            db.session.execute(
+                delete(Listing).where(Listing.id.in_(listing_ids)),
+                execution_options={"synchronize_session": False},
+            )
+        db.session.commit()
+        return make_response({'deleted': sorted(listing_ids), 'errors': errors}, 200)
+
+
+class GameOffers(Resource):
+    @conditional("listings", "games")
+    @cached("listings", "games")
+    def get(self, id):
+        if not db.session.get(Game, id):
+            return {'error': 'Game not found'}, 404
+        depends_on(f"games:{id}")
+        return make_response(game_offers(id), 200)
+
+
+class StoreInventory(Resource):
+    @conditional("listings", "stores")
+    @cached("listings", "stores")
+    def get(self, id):
+        if not db.session.get(Store, id):
+            return {'error': 'Store not found'}, 404
+        depends_on(f"stores:{id}")
+        return make_response(store_inventory(id), 200)
+
+
+def history_window(args):
+    days = query_number(args, "days")
+    if days is None:
+        return DEFAULT_DAYS
+    if days < 1:
+        raise ValueError("days must be a positive integer.")
+    return days
+
+
+class ListingHistory(Resource):
+    @conditional("listings")
+    @cached("listings")
+    def get(self, id):
+        try:
+            bucket = parse_bucket(request.args.get("bucket"))
+            days = history_window(request.args)
+            limit = parse_limit(request.args.get("limit"))
+        except ValueError as e:
+            return {'errors': str(e)}, 400
+        if not db.session.get(Listing, id):
+            return {'error': 'Listing not found'}, 404
+        depends_on(f"listings:{id}")
+        return make_response(listing_history(id, bucket, days, limit), 200)
+
+
+class GamePriceTrend(Resource):
+    @conditional("listings", "games")
+    @cached("listings", "games")
+    def get(self, id):
+        try:
+            bucket = parse_bucket(request.args.get("bucket"), "day")
+            days = history_window(request.args)
+        except ValueError as e:
+            return {'errors': str(e)}, 400
+        if not db.session.get(Game, id):
+            return {'error': 'Game not found'}, 404
+        depends_on(f"games:{id}")
+        return make_response(game_price_trend(id, bucket, days), 200)
+
+
+class Stats(Resource):
+    @conditional("listings")
+    @cached("listings", collection=True)
+    def get(self):
+        return make_response(catalog_stats(), 200)
+
+
+class Search(Resource):
+    @conditional("games", "stores")
+    def get(self):
+        kind = request.args.get("kind")
+        if kind not in (None, "game", "store"):
+            return {'errors': 'kind must be game or store'}, 400
+        try:
+            limit = parse_limit(request.args.get("limit"))
+            offset = parse_offset(request.args.get("offset"))
+            results = search(request.args.get("q"), kind, limit + 1, offset)
+        except ValueError as e:
+            return {'errors': str(e)}, 400
+
+        page = results[:limit]
+        # One query per kind for the matched rows, keeping the ranked order
+        objects = {}
+        for model, name in ((Game, "game"), (Store, "store")):
+            ids = [ref_id for result_kind, ref_id, score in page if result_kind == name]
+            if ids:
+                serialize = fast_serializers[model]
+                objects.update(((name, obj.id), serialize(obj)) for obj in model.query.filter(model.id.in_(ids)))
+
+        body = [
+            {"kind": result_kind, "score": score, "item": objects[(result_kind, ref_id)]}
+            for result_kind, ref_id, score in page
+            if (result_kind, ref_id) in objects
+        ]
+        response = make_response(body, 200)
+        if len(results) > limit:
+            link_next_page(response, limit=limit, offset=offset + limit)
+        return response
+
+
+class Changes(Resource):
+    def get(self):
+        if "since" not in request.args:
+            # Starting cursor for a client about to fetch the collections
+            return make_response({"changes": [], "next": latest_seq(), "more": False}, 200)
+        try:
+            since = query_number(request.args, "since") or 0
+            limit = parse_limit(request.args.get("limit"))
+        except ValueError as e:
+            return {'errors': str(e)}, 400
+        horizon = compaction_horizon()
+        if since < horizon:
+            return compacted(horizon)
+
+        entries = change_feed(since, limit + 1)
+        page = entries[:limit]
+        next_since = page[-1]["seq"] if page else since
+        response = make_response({"changes": page, "next": next_since, "more": len(entries) > limit}, 200)
+        if len(entries) > limit:
+            link_next_page(response, limit=limit, since=next_since)
+        return response
+
+
+class Jobs(Resource):
+    def get(self):
+        try:
+            limit = parse_limit(request.args.get("limit"))
+        except ValueError as e:
+            return {'errors': str(e)}, 400
+        jobs = Job.query.order_by(Job.id.desc()).limit(limit)
+        return make_response([job_to_dict(job) for job in jobs], 200)
+
+    def post(self):
+        json = request.get_json(silent=True)
+        name = json.get("name") if isinstance(json, dict) else None
+        if name not in MAINTENANCE_JOBS:
+            return {'errors': f"name must be one of: {', '.join(MAINTENANCE_JOBS)}"}, 400
+        return job_accepted(submit_job(name))
+
+
+class JobsById(Resource):
+    def get(self, id):
+        job = db.session.get(Job, id)
+        if not job:
+            return {'error': 'Job not found'}, 404
+        return make_response(job_to_dict(job), 200)
+
+
+api.representation('application/json')(output_json)
 api.add_resource(Games, "/games")
 api.add_resource(GamesById, "/games/<int:id>")
 api.add_resource(Stores, "/stores")
 api.add_resource(StoresById, "/stores/<int:id>")
+api.add_resource(StoresNearby, "/stores/nearby")
 api.add_resource(Listings, "/listings")
 api.add_resource(ListingsById, '/listings/<int:id>')
+api.add_resource(ListingsBulk, '/listings/bulk')
+api.add_resource(ListingStock, '/listings/<int:id>/<any(reserve, release):action>')
+api.add_resource(GameOffers, '/games/<int:id>/offers')
+api.add_resource(StoreInventory, '/stores/<int:id>/inventory')
+api.add_resource(ListingHistory, '/listings/<int:id>/history')
+api.add_resource(GamePriceTrend, '/games/<int:id>/price-trend')
+api.add_resource(Stats, '/stats')
+api.add_resource(Search, '/search')
+api.add_resource(Changes, '/changes')
+api.add_resource(Jobs, '/jobs')
+api.add_resource(JobsById, '/jobs/<int:id>')
+
+
+def create_app(config=None):
+    app = configure_app(config)
+    api.init_app(app)
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/export/<resource>', view_func=export)
+    app.add_url_rule('/changes/stream', view_func=change_stream)
+    # limits comes after metrics so rejected requests are still counted
+    for module in (caching, changes, encoding, history, inventory, jobs, metrics, limits):
+        module.init_app(app)
+    return app
+
+
+app = create_app()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+
+# Async deployment of the /games, /stores and /listings resources, with the
+# same JSON as app.py. Run from the server directory:
+#   uvicorn asgi:app --workers 4 --port 5555
+
+import json
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_accept_header
+
+from app import app as flask_app
+from config import db
+from encoding import compress, negotiate
+from models import Game, Store, Listing, child_deletes
+from pagination import page_query, parse_limit, split_page
+from params import filter_games, filter_listings, apply_changes, GAME_FIELDS, STORE_FIELDS
+from serializers import game_to_dict, store_to_dict, listing_to_dict
+
+# Importing app also registers the session listeners: table versions, cache
+# invalidation, the search index, the inventory summaries, store geohashes
+# and the change log. They read their settings from the Flask app, so the
+# handlers run inside its app context.
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_url():
+    # Resolved through Flask-SQLAlchemy so a relative SQLite path points at
+    # the same instance/ database as app.py
+    with flask_app.app_context():
+        url = db.engine.url
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+class AsyncBoundSession(db.session.session_factory.class_):
+    # Listeners registered on db.session live on its sessionmaker's class, so
+    # subclassing it runs them here too; binds come from the async engine
+    # instead of the Flask app
+    def __init__(self, **kwargs):
+        Session.__init__(self, **kwargs)
+        self._model_changes = {}
+
+    def get_bind(self, *args, **kwargs):
+        return Session.get_bind(self, *args, **kwargs)
+
+
+def async_engine_options(url):
+    options = dict(flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    if url.get_backend_name() == "sqlite" and options:
+        # aiosqlite defaults to NullPool (a new connection, and the pragmas,
+        # per request); pool file databases like the sync engine does
+        options['poolclass'] = AsyncAdaptedQueuePool
+    return options
+
+
+url = async_url()
+engine = create_async_engine(url, **async_engine_options(url))
+Sessions = async_sessionmaker(engine, sync_session_class=AsyncBoundSession, expire_on_commit=False)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # config.set_sqlite_pragmas only recognizes sqlite3 connections
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in flask_app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.args = MultiDict(parse_qsl(scope["query_string"].decode(), keep_blank_values=True))
+        self.headers = {name.decode().lower(): value.decode() for name, value in scope["headers"]}
+        self.base_url = f'{scope["scheme"]}://{self.headers.get("host", "localhost")}{self.path}'
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+def listing_query():
+    return select(Listing).options(joinedload(Listing.game), joinedload(Listing.store))
+
+
+async def collection(session, request, query, columns, serialize):
+    # Without limit/cursor the whole collection is returned, as in app.py
+    if "limit" not in request.args and "cursor" not in request.args:
+        rows = (await session.scalars(query.order_by(*columns))).all()
+        return [serialize(row) for row in rows], 200, {}
+
+    limit = parse_limit(request.args.get("limit"))
+    query = page_query(query, columns, limit, request.args.get("cursor"))
+    rows, next_cursor = split_page((await session.scalars(query)).all(), columns, limit)
+    headers = {}
+    if next_cursor:
+        next_url = request.base_url + "?" + urlencode({**request.args.to_dict(), "limit": limit, "cursor": next_cursor})
+        headers = {"X-Next-Cursor": next_cursor, "Link": f'<{next_url}>; rel="next"'}
+    return [serialize(row) for row in rows], 200, headers
+
+
+async def list_games(session, request):
+    return await collection(session, request, filter_games(select(Game), request.args), (Game.id,), game_to_dict)
+
+
+async def create_game(session, request):
+    json = request.json()
+    try:
+        game = Game(
+            title=json['title'],
+            rating=json['rating'],
+            console=json['console'],
+            genre=json['genre'],
+            image=json['image'],
+        )
+        session.add(game)
+        await session.commit()
+        return {**game_to_dict(game), "listings": []}, 201
+    except ValueError as e:
+        return {'errors': str(e)}, 400
+    except Exception as e:
+        return {"errors": "Failed to add game to database", 'message': str(e)}, 500
+
+
+async def get_game(session, request, id):
+    game = await session.get(Game, id)
+    if not game:
+        return {'error': 'Game not found'}, 404
+    return game_to_dict(game), 200
+
+
+async def patch_game(session, request, id):
+    json = request.json()
+    game = await session.get(Game, id)
+    if not game:
+        return {"error": "Game not found"}, 400
+    try:
+        if apply_changes(game, json, GAME_FIELDS):
+            await session.commit()
+        return game_to_dict(game), 202
+    except Exception as e:
+        await session.rollback()
+        return {"errors": "Failed to update game", "message": str(e)}, 400
+
+
+async def delete_game(session, request, id):
+    game = await session.get(Game, id)
+    if not game:
+        return {'error': 'Game not found'}, 404
+    for statement in child_deletes(game):
+        await session.execute(statement)
+    await session.delete(game)
+    await session.commit()
+    return {}, 204
+
+
+async def list_stores(session, request):
+    return await collection(session, request, select(Store), (Store.id,), store_to_dict)
+
+
+async def create_store(session, request):
+    json = request.json()
+    try:
+        store = Store(
+            name=json['name'], location=json['location'], hours=json['hours'],
+            latitude=json.get('latitude'), longitude=json.get('longitude'),
+        )
+        session.add(store)
+        await session.commit()
+        return {**store_to_dict(store), "listings": []}, 201
+    except ValueError as e:
+        return {'errors': str(e)}, 400
+    except Exception as e:
+        return {"errors": "Failed to add store to database", 'message': str(e)}, 500
+
+
+async def get_store(session, request, id):
+    store = await session.get(Store, id)
+    if not store:
+        return {'error': 'Store not found'}, 404
+    return store_to_dict(store), 200
+
+
+async def patch_store(session, request, id):
+    json = request.json()
+    store = await session.get(Store, id)
+    if not store:
+        return {"error": "Store not found"}, 400
+    try:
+        if apply_changes(store, json, STORE_FIELDS):
+            await session.commit()
+        return store_to_dict(store), 202
+    except ValueError:
+        await session.rollback()
+        return {'errors': ["validation errors"]}, 400
+
+
+async def delete_store(session, request, id):
+    store = await session.get(Store, id)
+    if not store:
+        return {'error': 'Store not found'}, 404
+    for statement in child_deletes(store):
+        await session.execute(statement)
+    await session.delete(store)
+    await session.commit()
+    return {}, 204
+
+
+async def list_listings(session, request):
+    query = filter_listings(listing_query(), request.args)
+    return await collection(session, request, query, (Listing.created_at, Listing.id), listing_to_dict)
+
+
+async def create_listing(session, request):
+    json = request.json()
+    try:
+        game = await session.get(Game, json['game_id'])
+        store = await session.get(Store, json['store_id'])
+        if not game or not store:
+            return {'error': 'Game or Store not found'}, 404
+        listing = Listing(condition=json['condition'], stock=json['stock'], price=json['price'], game=game, store=store)
+        session.add(listing)
+        await session.commit()
+        return listing_to_dict(listing), 201
+    except Exception as e:
+        return {"errors": "Failed to add listing", 'message': str(e)}, 500
+
+
+async def get_listing(session, request, id):
+    listing = await session.scalar(listing_query().where(Listing.id == id))
+    if not listing:
+        return {'error': 'Listing not found'}, 404
+    return listing_to_dict(listing), 200
+
+
+async def patch_listing(session, request, id):
+    json = request.json()
+    listing = await session.scalar(listing_query().where(Listing.id == id))
+    if not listing:
+        return {'error': 'Listing not found'}, 404
+    if isinstance(json, dict) and json.get("version", listing.version) != listing.version:
+        return {'errors': CONFLICT, 'version': listing.version}, 409
+    try:
+        changed = apply_changes(listing, json, ("condition", "stock", "price"))
+        for field, model, relation in (("game_id", Game, "game"), ("store_id", Store, "store")):
+            if field in json and json[field] != getattr(listing, field):
+                parent = await session.get(model, json[field])
+                if parent:
+                    setattr(listing, relation, parent)
+                    changed = True
+        if changed:
+            await session.commit()
+    except ValueError as e:
+        await session.rollback()
+        return {'errors': str(e)}, 400
+    except StaleDataError:
+        await session.rollback()
+        return {'errors': CONFLICT}, 409
+    return listing_to_dict(listing), 202
+
+
+async def change_listing_stock(session, request, id, action):
+    json = request.json() or {}
+    quantity = json.get("quantity", 1) if isinstance(json, dict) else None
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+        return {'errors': 'quantity must be a positive integer.'}, 400
+    stock = Listing.stock + (-quantity if action == "reserve" else quantity)
+    row = (await session.execute(
+        update(Listing)
+        .where(Listing.id == id, stock >= 0, stock <= 100)
+        .values(stock=stock, version=Listing.version + 1)
+        .returning(Listing.stock, Listing.version),
+        execution_options={"synchronize_session": False},
+    )).first()
+    if row is None:
+        await session.rollback()
+        current = await session.scalar(select(Listing.stock).where(Listing.id == id))
+        if current is None:
+            return {'error': 'Listing not found'}, 404
+        if action == "reserve":
+            return {'errors': 'Not enough stock.', 'stock': current}, 409
+        return {'errors': 'Stock can not exceed 100.', 'stock': current}, 409
+    await session.commit()
+    return {'id': id, 'stock': row.stock, 'version': row.version}, 200
+
+
+async def reserve_listing(session, request, id):
+    return await change_listing_stock(session, request, id, "reserve")
+
+
+async def release_listing(session, request, id):
+    return await change_listing_stock(session, request, id, "release")
+
+
+async def delete_listing(session, request, id):
+    listing = await session.get(Listing, id)
+    if not listing:
+        return {'error': 'Listing not found'}, 404
+    await session.delete(listing)
+    await session.commit()
+    return {}, 204
+
+
+ROUTES = [
+    (re.compile(r"/games"), {"GET": list_games, "POST": create_game}),
+    (re.compile(r"/games/(\d+)"), {"GET": get_game, "PATCH": patch_game, "DELETE": delete_game}),
+    (re.compile(r"/stores"), {"GET": list_stores, "POST": create_store}),
+    (re.compile(r"/stores/(\d+)"), {"GET": get_store, "PATCH": patch_store, "DELETE": delete_store}),
+    (re.compile(r"/listings"), {"GET": list_listings, "POST": create_listing}),
+    (re.compile(r"/listings/(\d+)"), {"GET": get_listing, "PATCH": patch_listing, "DELETE": delete_listing}),
+    (re.compile(r"/listings/(\d+)/reserve"), {"POST": reserve_listing}),
+    (re.compile(r"/listings/(\d+)/release"), {"POST": release_listing}),
+]
+
+NOT_FOUND = {"message": "The requested URL was not found on the server. If you entered the URL manually please check your spelling and try again."}
+METHOD_NOT_ALLOWED = {"message": "The method is not allowed for the requested URL."}
+BAD_REQUEST = {"message": "The browser (or proxy) sent a request that this server could not understand."}
+CONFLICT = "Listing was changed by another request; reload it and retry."
+
+
+def resolve(path):
+    for pattern, methods in ROUTES:
+        match = pattern.fullmatch(path)
+        if match:
+            return methods, [int(id) for id in match.groups()]
+    return None, []
+
+
+async def dispatch(request):
+    methods, ids = resolve(request.path)
+    if methods is None:
+        return NOT_FOUND, 404, {}
+    if request.method == "OPTIONS":
+        # CORS preflight, answered like Flask-CORS does
+        return None, 200, {
+            "Allow": ", ".join(methods),
+            "Access-Control-Allow-Methods": ", ".join(methods),
+            "Access-Control-Allow-Headers": request.headers.get("access-control-request-headers", "*"),
+        }
+    handler = methods.get(request.method)
+    if handler is None:
+        return METHOD_NOT_ALLOWED, 405, {"Allow": ", ".join(methods)}
+
+    try:
+        request.json()
+    except ValueError:
+        return BAD_REQUEST, 400, {}
+    with flask_app.app_context():
+        async with Sessions() as session:
+            try:
+                result = await handler(session, request, *ids)
+            except ValueError as e:
+                return {'errors': str(e)}, 400, {}
+    return result if len(result) == 3 else (*result, {})
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await engine.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    request = Request(scope, await read_body(receive))
+    data, status, headers = await dispatch(request)
+    body = flask_app.json.dumps(data, separators=(",", ":")).encode() if data is not None and status != 204 else b""
+    headers = {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Expose-Headers": "X-Next-Cursor, Link",
+        **headers,
+    }
+    if body:
+        # Negotiated like encoding.compress_response does for the Flask app
+        headers["Vary"] = "Accept-Encoding"
+        accept = parse_accept_header(request.headers.get("accept-encoding"))
+        encoding = negotiate(accept, len(body), flask_app.config)
+        if encoding:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(name.lower().encode(), str(value).encode()) for name, value in headers.items()],
+    })
+    await send({"type": "http.response.body", "body": body})
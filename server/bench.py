@@ -0,0 +1,634 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import http.client
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+# Remote library imports
+from sqlalchemy import delete, event, func, insert, select
+
+# Local imports
+from app import app
+from models import db, Game, Store, Listing
+from serializers import listing_to_dict, listing_row_to_dict, game_to_dict, store_to_dict
+from encoding import JSONProvider, compress, brotli, orjson
+from search import CREATE_FTS
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def build_listings(count):
+    games = [
+        Game(id=i, title=f"Game {i}", rating="E", console="PC", genre="RPG", image=f"https://example.com/{i}.png")
+        for i in range(1, 51)
+    ]
+    stores = [
+        Store(id=i, name=f"Store {i}", location=f"{i} Main St", hours="9:00 - 21:00")
+        for i in range(1, 11)
+    ]
+    listings = []
+    for i in range(1, count + 1):
+        game = games[i % len(games)]
+        store = stores[i % len(stores)]
+        listing = Listing(id=i, price=19.99, stock=i % 100, condition="New", created_at=datetime(2024, 1, 1))
+        listing.game, listing.game_id = game, game.id
+        listing.store, listing.store_id = store, store.id
+        listings.append(listing)
+    return listings
+
+
+def bench_serializers(args):
+    print(f"{'rows':>8} {'to_dict':>10} {'compiled':>10} {'speedup':>8}")
+    for rows in args.rows:
+        listings = build_listings(rows)
+        assert listings[0].to_dict() == listing_to_dict(listings[0])
+        mixin = timed(lambda: [listing.to_dict() for listing in listings], args.repeat)
+        fast = timed(lambda: [listing_to_dict(listing) for listing in listings], args.repeat)
+        print(f"{rows:>8} {mixin:>9.3f}s {fast:>9.3f}s {mixin / fast:>7.1f}x")
+
+
+def bench_encoding(args):
+    # Bytes and encode time of a /listings body: indented stdlib JSON (the
+    # old default), compact stdlib, compact orjson, then the compact body
+    # compressed with each encoding
+    stdlib = JSONProvider(app)
+    stdlib.use_orjson = False
+    encoders = [
+        ("json, indented", lambda data: stdlib.dumps(data, indent=2)),
+        ("json, compact", lambda data: stdlib.dumps(data, separators=(",", ":"))),
+    ]
+    if orjson:
+        fast = JSONProvider(app)
+        fast.use_orjson = True
+        encoders.append(("orjson, compact", lambda data: fast.dumps(data, separators=(",", ":"))))
+    encodings = ["gzip"] + (["br"] if brotli else [])
+
+    for rows in args.rows:
+        data = [listing_to_dict(listing) for listing in build_listings(rows)]
+        print(f"{rows} listings")
+        for name, encode in encoders:
+            size = len(encode(data).encode())
+            print(f"  {name:<18} {size:>12} bytes {timed(lambda: encode(data), args.repeat) * 1000:>9.1f} ms")
+        body = encoders[-1][1](data).encode()
+        for name in encodings:
+            size = len(compress(body, name))
+            elapsed = timed(lambda: compress(body, name), args.repeat)
+            print(f"  {name:<18} {size:>12} bytes {elapsed * 1000:>9.1f} ms  ({len(body) / size:.1f}x smaller)")
+
+
+def bench_include(args):
+    # /listings bodies with nested games and stores vs ?include=game,store,
+    # where each game and store is serialized once (50 games, 10 stores)
+    print(f"{'rows':>8} {'nested':>12} {'included':>12} {'nested ms':>10} {'included ms':>12}")
+    encode = app.json.dumps
+    for rows in args.rows:
+        listings = build_listings(rows)
+
+        def nested():
+            return encode([listing_to_dict(listing) for listing in listings])
+
+        def included():
+            games = {str(listing.game.id): listing.game for listing in listings}
+            stores = {str(listing.store.id): listing.store for listing in listings}
+            return encode({
+                "data": [listing_row_to_dict(listing) for listing in listings],
+                "included": {
+                    "games": {id: game_to_dict(game) for id, game in games.items()},
+                    "stores": {id: store_to_dict(store) for id, store in stores.items()},
+                },
+            })
+
+        print(
+            f"{rows:>8} {len(nested()):>12} {len(included()):>12} "
+            f"{timed(nested, args.repeat) * 1000:>10.1f} {timed(included, args.repeat) * 1000:>12.1f}"
+        )
+
+
+def bench_concurrency(args):
+    # Readers query listings while one writer commits new rows as fast as it can
+    app.config['SQLITE_PRAGMAS']['journal_mode'] = args.journal_mode
+    db.engine.dispose()
+    game_id = db.session.scalar(select(Game.id).limit(1))
+    store_id = db.session.scalar(select(Store.id).limit(1))
+    if not game_id or not store_id:
+        sys.exit("Seed the database first: python seed.py")
+
+    stop = threading.Event()
+    reads, writes, errors, created = [0] * args.readers, [0], [0], []
+
+    def writer():
+        with app.app_context():
+            while not stop.is_set():
+                try:
+                    listing = Listing(price=9.99, stock=1, condition="New", game_id=game_id, store_id=store_id)
+                    db.session.add(listing)
+                    db.session.commit()
+                    created.append(listing.id)
+                    writes[0] += 1
+                except Exception:
+                    db.session.rollback()
+                    errors[0] += 1
+
+    def reader(i):
+        with app.app_context():
+            while not stop.is_set():
+                try:
+                    db.session.execute(select(Listing).order_by(Listing.id.desc()).limit(50)).all()
+                    reads[i] += 1
+                except Exception:
+                    errors[0] += 1
+                finally:
+                    db.session.rollback()
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    db.session.execute(delete(Listing).where(Listing.id.in_(created)))
+    db.session.commit()
+    print(f"journal_mode={args.journal_mode} readers={args.readers} seconds={args.seconds}")
+    print(f"reads/s  {sum(reads) / args.seconds:>10.1f}")
+    print(f"writes/s {writes[0] / args.seconds:>10.1f}")
+    print(f"errors   {errors[0]:>10}")
+
+
+def bench_search(args):
+    # Standalone in-memory catalog so the comparison doesn't touch app.db
+    words = ["dark", "souls", "legend", "kingdom", "ninja", "cyber", "mega", "quest", "wild", "hunt",
+             "shadow", "star", "racing", "tactics", "fantasy", "storm", "iron", "sky", "ghost", "dragon"]
+    rng = random.Random(args.seed)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE games (id INTEGER PRIMARY KEY, title TEXT, genre TEXT, console TEXT)")
+    conn.executemany(
+        "INSERT INTO games (title, genre, console) VALUES (?, ?, ?)",
+        (
+            (" ".join(rng.sample(words, 3)) + f" {i}", rng.choice(["RPG", "Action", "Shooter"]), rng.choice(["PC", "Xbox"]))
+            for i in range(args.rows)
+        ),
+    )
+    conn.execute(CREATE_FTS)
+    conn.execute(
+        "INSERT INTO search_index (kind, ref_id, title, body) "
+        "SELECT 'game', id, title, genre || ' ' || console FROM games"
+    )
+
+    # Selective two-term queries, e.g. "dark 4821": LIKE has to scan every row
+    like = "SELECT id FROM games WHERE (title || ' ' || genre || ' ' || console) LIKE ? AND title LIKE ? LIMIT 20"
+    fts = "SELECT ref_id FROM search_index WHERE search_index MATCH ? ORDER BY rank LIMIT 20"
+    terms = [(rng.choice(words), str(rng.randrange(args.rows))) for _ in range(args.queries)]
+    like_time = timed(lambda: [conn.execute(like, (f"%{a}%", f"%{b}%")).fetchall() for a, b in terms], 1)
+    fts_time = timed(lambda: [conn.execute(fts, (f'"{a}"* "{b}"*',)).fetchall() for a, b in terms], 1)
+    print(f"{args.rows} games, {args.queries} queries")
+    print(f"LIKE '%q%' scan  {like_time / args.queries * 1000:>8.3f} ms/query")
+    print(f"FTS5 MATCH       {fts_time / args.queries * 1000:>8.3f} ms/query (ranked)")
+
+
+class LoadClient:
+    # One keep-alive connection per thread; latencies are grouped by route
+    # template so /games/1 and /games/2 land in the same series
+    def __init__(self, base_url, timings):
+        url = urlsplit(base_url)
+        self.connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        self.timings = timings
+        self.errors = 0
+
+    def request(self, method, route, path, body=None):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            self.errors += 1
+            return None
+        self.timings.setdefault(f"{method} {route}", []).append(time.perf_counter() - start)
+        if response.status >= 400:
+            self.errors += 1
+            return None
+        return json.loads(data) if data and response.getheader("Content-Type", "").startswith("application/json") else None
+
+
+CORE_ROUTES = {"/games", "/games/<id>", "/stores", "/stores/<id>", "/listings", "/listings/<id>"}
+
+
+def load_reads(client, rng, ids, routes):
+    game_id, store_id, listing_id = rng.choice(ids["games"]), rng.choice(ids["stores"]), rng.choice(ids["listings"])
+    reads = [
+        ("/games", "/games?limit=50"),
+        ("/games", "/games?" + urlencode({"console": "PC", "limit": 50})),
+        ("/games/<id>", f"/games/{game_id}"),
+        ("/stores", "/stores?limit=50"),
+        ("/stores/<id>", f"/stores/{store_id}"),
+        ("/listings", "/listings?limit=50"),
+        ("/listings", f"/listings?game_id={game_id}&limit=50"),
+        ("/listings/<id>", f"/listings/{listing_id}"),
+        ("/games/<id>/offers", f"/games/{game_id}/offers"),
+        ("/stores/<id>/inventory", f"/stores/{store_id}/inventory"),
+        ("/search", "/search?" + urlencode({"q": rng.choice(["dark", "star", "game"])})),
+        ("/stats", "/stats"),
+        ("/export/<resource>", "/export/stores"),
+    ]
+    route, path = rng.choice([read for read in reads if routes is None or read[0] in routes])
+    client.request("GET", route, path)
+
+
+def load_writes(client, rng, ids, routes):
+    game_id, store_id = rng.choice(ids["games"]), rng.choice(ids["stores"])
+    tag = f"{threading.get_ident() % 100000}-{rng.randrange(10 ** 9)}"
+    listing = {"condition": "New", "stock": 5, "price": 19.99, "game_id": game_id, "store_id": store_id}
+    kind = rng.choice(["game", "store", "listing"] + (["bulk"] if routes is None else []))
+
+    if kind == "game":
+        game = {"title": f"Load {tag}", "rating": "E", "console": "PC", "genre": "Action", "image": "https://example.com/x.png"}
+        created = client.request("POST", "/games", "/games", game)
+        if created:
+            client.request("PATCH", "/games/<id>", f"/games/{created['id']}", {**game, "genre": "RPG"})
+            client.request("DELETE", "/games/<id>", f"/games/{created['id']}")
+    elif kind == "store":
+        store = {"name": f"Load {tag}", "location": "1 Main St", "hours": "9:00 - 21:00"}
+        created = client.request("POST", "/stores", "/stores", store)
+        if created:
+            client.request("PATCH", "/stores/<id>", f"/stores/{created['id']}", {**store, "hours": "10:00 - 20:00"})
+            client.request("DELETE", "/stores/<id>", f"/stores/{created['id']}")
+    elif kind == "listing":
+        created = client.request("POST", "/listings", "/listings", listing)
+        if created:
+            client.request("PATCH", "/listings/<id>", f"/listings/{created['id']}", {**listing, "price": 17.99})
+            client.request("DELETE", "/listings/<id>", f"/listings/{created['id']}")
+    else:
+        created = client.request("POST", "/listings/bulk", "/listings/bulk", [listing] * 10)
+        if created:
+            new_ids = created["created"]
+            client.request("PATCH", "/listings/bulk", "/listings/bulk", [{"id": id, "stock": 3} for id in new_ids])
+            client.request("DELETE", "/listings/bulk", "/listings/bulk", new_ids)
+
+
+def bench_changes(args):
+    # What a polling client downloads to catch up after some listing writes:
+    # the three collections again, or the change feed since its cursor
+    listing_ids = db.session.scalars(select(Listing.id).limit(1000)).all()
+    if not listing_ids:
+        sys.exit("Seed the database first: python seed.py")
+    client = app.test_client()
+    cursor = client.get("/changes").get_json()["next"]
+    rng = random.Random(args.seed)
+    for id in rng.sample(listing_ids, min(args.writes, len(listing_ids))):
+        client.patch(f"/listings/{id}", json={"price": round(5 + rng.random() * 50, 2)})
+
+    def fetch(paths):
+        start = time.perf_counter()
+        size = sum(len(client.get(path).data) for path in paths)
+        return size, time.perf_counter() - start
+
+    full_size, full_time = fetch(["/games", "/stores", "/listings"])
+    feed_size, feed_time = fetch([f"/changes?since={cursor}&limit=100"])
+    print(f"{args.writes} listing writes")
+    print(f"{'refetch collections':<20} {full_size:>12} bytes {full_time * 1000:>9.1f} ms")
+    print(f"{'change feed':<20} {feed_size:>12} bytes {feed_time * 1000:>9.1f} ms")
+    print(f"{full_size / feed_size:.0f}x fewer bytes, {full_time / feed_time:.0f}x less time")
+
+
+def bench_reserve(args):
+    # Threads reserve one unit at a time from a single listing until it runs
+    # out, then read-modify-write its stock through version-checked PATCHes
+    game_id = db.session.scalar(select(Game.id).limit(1))
+    store_id = db.session.scalar(select(Store.id).limit(1))
+    if not game_id or not store_id:
+        sys.exit("Seed the database first: python seed.py")
+    listing = Listing(price=9.99, stock=args.stock, condition="New", game_id=game_id, store_id=store_id)
+    db.session.add(listing)
+    db.session.commit()
+    path = f"/listings/{listing.id}"
+    db.session.remove()
+
+    def run(work):
+        counts = [{} for _ in range(args.threads)]
+
+        def worker(i):
+            client = app.test_client()
+            while work(client, counts[i]):
+                pass
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        totals = {}
+        for count in counts:
+            for key, value in count.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals, elapsed
+
+    def reserve(client, count):
+        status = client.post(f"{path}/reserve", json={"quantity": 1}).status_code
+        count[status] = count.get(status, 0) + 1
+        return status == 200 or (status != 409 and count[status] < 100)
+
+    def increment(client, count):
+        if count.get("done", 0) >= args.increments:
+            return False
+        current = client.get(path).get_json()
+        response = client.patch(path, json={"stock": current["stock"] + 1, "version": current["version"]})
+        count[response.status_code] = count.get(response.status_code, 0) + 1
+        count["done"] = count.get("done", 0) + (response.status_code == 202)
+        if response.status_code == 409:
+            # Back off like a client would before reloading and retrying
+            time.sleep(random.random() * 0.01 * args.threads)
+        return response.status_code in (202, 409)
+
+    reserved, elapsed = run(reserve)
+    stock = app.test_client().get(path).get_json()["stock"]
+    print(f"reserve   threads={args.threads} stock={args.stock}")
+    print(f"  reserved {reserved.get(200, 0)}, refused {reserved.get(409, 0)}, final stock {stock}")
+    print(f"  {reserved.get(200, 0) / elapsed:.1f} reservations/s")
+
+    patched, elapsed = run(increment)
+    stock = app.test_client().get(path).get_json()["stock"]
+    print(f"increment threads={args.threads} increments/thread={args.increments}")
+    print(f"  applied {patched.get(202, 0)}, conflicts {patched.get(409, 0)}, final stock {stock}")
+    print(f"  {patched.get(202, 0) / elapsed:.1f} updates/s")
+
+    db.session.execute(delete(Listing).where(Listing.id == listing.id))
+    db.session.commit()
+
+
+def bench_deletes(args):
+    # DELETE /stores/<id> for stores with more and more listings
+    game_ids = db.session.scalars(select(Game.id).limit(100)).all()
+    if not game_ids:
+        sys.exit("Seed the database first: python seed.py")
+    rng = random.Random(args.seed)
+    statements = []
+    event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+    client = app.test_client()
+    for rows in args.rows:
+        store = Store(name="Bench Store", location="1 Bench Street", hours="9:00 - 17:00")
+        db.session.add(store)
+        db.session.commit()
+        db.session.execute(insert(Listing), [
+            {"price": 9.99, "stock": 1, "condition": "New", "game_id": rng.choice(game_ids), "store_id": store.id}
+            for _ in range(rows)
+        ])
+        db.session.commit()
+        db.session.remove()
+
+        del statements[:]
+        start = time.perf_counter()
+        status = client.delete(f"/stores/{store.id}").status_code
+        elapsed = time.perf_counter() - start
+        left = db.session.scalar(select(func.count(Listing.id)).where(Listing.store_id == store.id))
+        db.session.remove()
+        print(f"{rows:>8} listings {elapsed * 1000:>9.1f} ms {len(statements):>4} statements  status {status}, left {left}")
+
+
+def import_times(module):
+    # (name, depth, cumulative microseconds) for every module a fresh
+    # interpreter imports to import module
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode:
+        sys.exit(result.stderr)
+    rows = []
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            name = fields[2].rstrip()
+            rows.append((name.strip(), (len(name) - len(name.lstrip())) // 2, int(fields[1])))
+    return rows
+
+
+def bench_startup(args):
+    # Cold import time of a server entry point in fresh interpreters, and
+    # the direct imports that take longest
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    totals = sorted(next(total for name, depth, total in rows if name == args.module) for rows in runs)
+    median = totals[len(totals) // 2] / 1000
+    print(f"import {args.module}: median {median:.0f} ms, min {totals[0] / 1000:.0f} ms over {args.runs} runs")
+
+    direct = sorted(((total, name) for name, depth, total in runs[0] if depth == 1), reverse=True)
+    for total, name in direct[:args.top]:
+        print(f"  {total / 1000:>8.1f} ms  {name}")
+
+
+def bench_overload(args):
+    # Far more concurrent writers than the database can take, plus readers,
+    # first without the admission gate and then with it
+    from app import create_app
+
+    ids = db.session.scalars(select(Listing.id).limit(1000)).all()
+    if not ids:
+        sys.exit("Seed the database first: python seed.py")
+    db.session.remove()
+
+    def run(config):
+        overloaded = create_app(config)
+        stop = threading.Event()
+        results = []
+
+        def worker(i, write):
+            rng = random.Random(args.seed + i)
+            client = overloaded.test_client()
+            while not stop.is_set():
+                path = f"/listings/{rng.choice(ids)}"
+                start = time.perf_counter()
+                if write:
+                    status = client.patch(path, json={"price": round(rng.uniform(5, 60), 2)}).status_code
+                else:
+                    status = client.get(path).status_code
+                results.append(("write" if write else "read", status, time.perf_counter() - start))
+
+        threads = [threading.Thread(target=worker, args=(i, True)) for i in range(args.writers)]
+        threads += [threading.Thread(target=worker, args=(args.writers + i, False)) for i in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    for gated in (False, True):
+        max_writes = args.max_writes if gated else 0
+        results = run({
+            "ADMISSION_MAX_WRITES": max_writes,
+            "ADMISSION_MAX_QUEUE": args.max_queue,
+            "ADMISSION_TIMEOUT": args.timeout,
+        })
+        print(f"admission gate {'max_writes=' + str(max_writes) if gated else 'off'}")
+        print(f"  {'kind':<6} {'ok':>7} {'ok/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'503':>6} {'409':>6}")
+        for kind in ("read", "write", "all"):
+            rows = [row for row in results if kind in ("all", row[0])]
+            ok = sorted(elapsed for _, status, elapsed in rows if status < 300)
+            busy = sum(status == 503 for _, status, _ in rows)
+            # Two writers on the same listing; the loser gets the version conflict
+            conflicts = sum(status == 409 for _, status, _ in rows)
+            if not ok:
+                print(f"  {kind:<6} {0:>7} {'':>8} {'':>8} {'':>8} {'':>8} {busy:>6} {conflicts:>6}")
+                continue
+            p50, p99 = (percentile(ok, fraction) * 1000 for fraction in (0.5, 0.99))
+            print(
+                f"  {kind:<6} {len(ok):>7} {len(ok) / args.seconds:>8.1f} {p50:>8.1f} {p99:>8.1f}"
+                f" {ok[-1] * 1000:>8.1f} {busy:>6} {conflicts:>6}"
+            )
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def bench_load(args):
+    # Drives a running server (python app.py, gunicorn or uvicorn asgi:app)
+    # over HTTP. --routes core limits it to what asgi.py serves
+    ids = {
+        "games": db.session.scalars(select(Game.id).limit(1000)).all(),
+        "stores": db.session.scalars(select(Store.id).limit(1000)).all(),
+        "listings": db.session.scalars(select(Listing.id).limit(1000)).all(),
+    }
+    if not all(ids.values()):
+        sys.exit("Seed the database first: python seed.py")
+
+    routes = CORE_ROUTES if args.routes == "core" else None
+    stop = threading.Event()
+    clients = []
+
+    def worker(i):
+        rng = random.Random(args.seed + i)
+        client = LoadClient(args.url, {})
+        clients.append(client)
+        while not stop.is_set():
+            if rng.random() < args.write_ratio:
+                load_writes(client, rng, ids, routes)
+            else:
+                load_reads(client, rng, ids, routes)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    timings = {}
+    for client in clients:
+        for route, values in client.timings.items():
+            timings.setdefault(route, []).extend(values)
+    timings["ALL"] = [value for values in timings.values() for value in values]
+
+    print(f"{args.url} routes={args.routes} concurrency={args.concurrency} seconds={args.seconds} write_ratio={args.write_ratio}")
+    print(f"{'route':<32} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route in sorted(timings, key=lambda route: (route == "ALL", route)):
+        values = sorted(timings[route])
+        if not values:
+            continue
+        p50, p95, p99 = (percentile(values, fraction) * 1000 for fraction in (0.5, 0.95, 0.99))
+        print(f"{route:<32} {len(values):>7} {len(values) / elapsed:>8.1f} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f}")
+    print(f"errors {sum(client.errors for client in clients)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="GameNest server benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serializers = commands.add_parser("serializers", help="to_dict vs precompiled serializers")
+    serializers.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    serializers.add_argument("--repeat", type=int, default=3)
+    serializers.set_defaults(run=bench_serializers)
+
+    encoding = commands.add_parser("encoding", help="JSON encoders and response compression on /listings bodies")
+    encoding.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    encoding.add_argument("--repeat", type=int, default=3)
+    encoding.set_defaults(run=bench_encoding)
+
+    include = commands.add_parser("include", help="nested vs ?include= /listings bodies")
+    include.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    include.add_argument("--repeat", type=int, default=3)
+    include.set_defaults(run=bench_include)
+
+    concurrency = commands.add_parser("concurrency", help="read throughput while a writer is active (SQLite)")
+    concurrency.add_argument("--journal-mode", default="WAL", choices=["WAL", "DELETE"])
+    concurrency.add_argument("--readers", type=int, default=4)
+    concurrency.add_argument("--seconds", type=float, default=5)
+    concurrency.set_defaults(run=bench_concurrency)
+
+    search = commands.add_parser("search", help="FTS5 vs LIKE scan on a synthetic catalog")
+    search.add_argument("--rows", type=int, default=100000)
+    search.add_argument("--queries", type=int, default=200)
+    search.add_argument("--seed", type=int, default=1)
+    search.set_defaults(run=bench_search)
+
+    changes = commands.add_parser("changes", help="catching up through /changes vs refetching the collections")
+    changes.add_argument("--writes", type=int, default=20)
+    changes.add_argument("--seed", type=int, default=0)
+    changes.set_defaults(run=bench_changes)
+
+    reserve = commands.add_parser("reserve", help="concurrent reservations and version-checked PATCHes on one listing")
+    reserve.add_argument("--threads", type=int, default=8)
+    reserve.add_argument("--stock", type=int, default=100)
+    reserve.add_argument("--increments", type=int, default=10)
+    reserve.set_defaults(run=bench_reserve)
+
+    deletes = commands.add_parser("deletes", help="DELETE /stores/<id> time and statements as the store's listings grow")
+    deletes.add_argument("--rows", type=int, nargs="+", default=[10, 1000, 100000])
+    deletes.add_argument("--seed", type=int, default=0)
+    deletes.set_defaults(run=bench_deletes)
+
+    startup = commands.add_parser("startup", help="cold import time of a server entry point")
+    startup.add_argument("--module", default="app", choices=["app", "asgi"])
+    startup.add_argument("--runs", type=int, default=7)
+    startup.add_argument("--top", type=int, default=10)
+    startup.set_defaults(run=bench_startup)
+
+    overload = commands.add_parser("overload", help="accepted request latency under write overload, with and without the admission gate")
+    overload.add_argument("--writers", type=int, default=32)
+    overload.add_argument("--readers", type=int, default=4)
+    overload.add_argument("--seconds", type=float, default=5)
+    overload.add_argument("--max-writes", type=int, default=4)
+    overload.add_argument("--max-queue", type=int, default=16)
+    overload.add_argument("--timeout", type=float, default=2)
+    overload.add_argument("--seed", type=int, default=1)
+    overload.set_defaults(run=bench_overload)
+
+    load = commands.add_parser("load", help="HTTP load test against a running server")
+    load.add_argument("--url", default="http://127.0.0.1:5555")
+    load.add_argument("--concurrency", type=int, default=8)
+    load.add_argument("--seconds", type=float, default=10)
+    load.add_argument("--write-ratio", type=float, default=0.1)
+    load.add_argument("--routes", default="all", choices=["all", "core"])
+    load.add_argument("--seed", type=int, default=1)
+    load.set_defaults(run=bench_load)
+
+    args = parser.parse_args()
+    with app.app_context():
+        args.run(args)
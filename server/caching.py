@@ -0,0 +1,248 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from urllib.parse import urlencode
+
+from flask import current_app, g, request, Response
+from sqlalchemy import event, inspect
+
+from config import db
+from models import Game, Store, Listing
+
+CACHED_MODELS = (Game, Store, Listing)
+
+# Tags:
+#   "games"     membership of game collections (any insert/update/delete)
+#   "games:7"   responses that contain game 7, directly or nested
+#   "games:*"   every response read from the games table, cleared by bulk
+#               statements whose affected rows are not known
+
+
+class LocalCache:
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.lock = Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        # Bumped by every invalidation; see cached()
+        self.generation = 0
+
+    def current_generation(self):
+        return self.generation
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[1]
+            if entry:
+                self._remove(key)
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key, value, tags, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.counters["evictions"] += 1
+
+    def invalidate(self, tags):
+        with self.lock:
+            self.generation += 1
+            for tag in tags:
+                for key in self.tags.pop(tag, ()):
+                    if key in self.entries:
+                        self._remove(key)
+                        self.counters["invalidations"] += 1
+
+    def _remove(self, key):
+        expires, value, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "size": len(self.entries), "backend": "local"}
+
+
+class RedisCache:
+    # Shared by every gunicorn worker; redis handles TTL and LRU eviction
+    def __init__(self, url, ttl, prefix="gamenest:cache:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.watch_error = redis.WatchError
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def current_generation(self):
+        return int(self.client.get(self.prefix + "generation") or 0)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        self.client.hincrby(self.prefix + "stats", "hits" if raw else "misses", 1)
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value, tags, generation):
+        with self.client.pipeline() as pipe:
+            try:
+                # Aborts if another worker invalidates in between
+                pipe.watch(self.prefix + "generation")
+                if int(pipe.get(self.prefix + "generation") or 0) != generation:
+                    return
+                pipe.multi()
+                pipe.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+                for tag in tags:
+                    pipe.sadd(self.prefix + "tag:" + tag, key)
+                    pipe.expire(self.prefix + "tag:" + tag, self.ttl)
+                pipe.execute()
+            except self.watch_error:
+                pass
+
+    def invalidate(self, tags):
+        self.client.incr(self.prefix + "generation")
+        tag_keys = [self.prefix + "tag:" + tag for tag in tags]
+        keys = [self.prefix + key.decode() for key in self.client.sunion(tag_keys)] if tag_keys else []
+        if keys:
+            self.client.delete(*keys)
+            self.client.hincrby(self.prefix + "stats", "invalidations", len(keys))
+        if tag_keys:
+            self.client.delete(*tag_keys)
+
+    def stats(self):
+        counters = {key.decode(): int(value) for key, value in self.client.hgetall(self.prefix + "stats").items()}
+        evictions = self.client.info("stats").get("evicted_keys", 0)
+        return {"hits": 0, "misses": 0, "invalidations": 0, **counters, "evictions": evictions, "backend": "redis"}
+
+
+def make_cache(config):
+    if config['RESPONSE_CACHE_URL']:
+        return RedisCache(config['RESPONSE_CACHE_URL'], config['RESPONSE_CACHE_TTL'])
+    return LocalCache(config['RESPONSE_CACHE_SIZE'], config['RESPONSE_CACHE_TTL'])
+
+
+def response_cache():
+    return current_app.extensions['response_cache']
+
+
+def row_tags(obj):
+    tags = {f"{obj.__tablename__}:{obj.id}"}
+    if isinstance(obj, Listing):
+        tags.update((f"games:{obj.game_id}", f"stores:{obj.store_id}"))
+    return tags
+
+
+def track(obj):
+    # Called by the serializers so a cached response knows which rows it holds
+    if "cache_tags" in g:
+        g.cache_tags.update(row_tags(obj))
+
+
+def depends_on(*tags):
+    # For responses built from aggregates rather than serialized rows
+    if "cache_tags" in g:
+        g.cache_tags.update(tags)
+
+
+def cache_key():
+    return request.path + "?" + urlencode(sorted(request.args.items(multi=True)))
+
+
+def cached(*tables, collection=False):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = cache_key()
+            cache = response_cache()
+            entry = cache.get(key)
+            if entry:
+                return Response(entry["body"], status=entry["status"], headers=entry["headers"])
+
+            # A response read before a concurrent write commits must not be
+            # stored after that write's invalidation, so it is only cached
+            # if nothing was invalidated while it was being built
+            generation = cache.current_generation()
+            g.cache_tags = {f"{table}:*" for table in tables}
+            if collection:
+                g.cache_tags.add(tables[0])
+            response = fn(*args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                headers = [(name, value) for name, value in response.headers if name != "Content-Length"]
+                entry = {"body": response.get_data(as_text=True), "status": 200, "headers": headers}
+                cache.set(key, entry, g.cache_tags, generation)
+            return response
+        return wrapper
+    return decorator
+
+
+def changed_tags(obj):
+    tags = row_tags(obj) | {obj.__tablename__}
+    if isinstance(obj, Listing):
+        # A listing moved to another game or store also changes the old parent
+        state = inspect(obj)
+        for attr, table in (("game_id", "games"), ("store_id", "stores")):
+            tags.update(f"{table}:{id}" for id in state.attrs[attr].history.deleted if id)
+    return tags
+
+
+def pending_tags(session):
+    return session.info.setdefault("cache_tags", set())
+
+
+@event.listens_for(db.session, "after_flush")
+def collect_flushed_tags(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, CACHED_MODELS):
+            pending_tags(session).update(changed_tags(obj))
+
+
+@event.listens_for(db.session, "do_orm_execute")
+def collect_bulk_tags(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in CACHED_MODELS:
+        table = mapper.local_table.name
+        pending_tags(orm_execute_state.session).update((table, f"{table}:*"))
+
+
+@event.listens_for(db.session, "after_commit")
+def invalidate_committed(session):
+    tags = session.info.pop("cache_tags", None)
+    if tags:
+        response_cache().invalidate(tags)
+
+
+@event.listens_for(db.session, "after_rollback")
+def discard_rolled_back(session):
+    session.info.pop("cache_tags", None)
+
+
+def cache_stats():
+    return response_cache().stats()
+
+
+def init_app(app):
+    app.config.setdefault('RESPONSE_CACHE_URL', os.environ.get('RESPONSE_CACHE_URL'))
+    app.config.setdefault('RESPONSE_CACHE_SIZE', int(os.environ.get('RESPONSE_CACHE_SIZE', 1024)))
+    app.config.setdefault('RESPONSE_CACHE_TTL', int(os.environ.get('RESPONSE_CACHE_TTL', 60)))
+    app.extensions['response_cache'] = make_cache(app.config)
+    app.add_url_rule('/cache/stats', view_func=cache_stats)
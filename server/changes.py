@@ -0,0 +1,215 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, inspect, literal, select, text, update
+from sqlalchemy.orm import joinedload, object_session
+
+from config import db
+from models import Change, Game, Store, Listing, TableVersion, CHANGE_OPS
+from serializers import fast_serializers
+
+LOGGED_MODELS = (Game, Store, Listing)
+
+# The table_versions row named "changes" holds the compaction horizon: log
+# entries up to that seq may have been dropped, so a client that last saw
+# an older seq has to refetch the collections
+HORIZON = "changes"
+
+
+def pending_changes(session):
+    return session.info.setdefault("changes", [])
+
+
+def net_update(target):
+    # after_update also fires for rows only dirtied through a collection
+    # (a new listing appends to game.listings); a game's consoles count
+    state = inspect(target)
+    if any(state.attrs[attr.key].history.has_changes() for attr in state.mapper.column_attrs):
+        return True
+    return isinstance(target, Game) and state.attrs.console_links.history.has_changes()
+
+
+def queue_change(op):
+    def listener(mapper, connection, target):
+        session = object_session(target)
+        if session is not None and (op != "update" or net_update(target)):
+            pending_changes(session).append((target.__tablename__, target.id, op))
+    return listener
+
+
+# Mapper events only queue the entry; after_flush writes the whole flush
+# with one executemany
+for model in LOGGED_MODELS:
+    for op in CHANGE_OPS:
+        event.listen(model, f"after_{op}", queue_change(op))
+
+
+def lock_log(connection):
+    if connection.dialect.name == "postgresql":
+        # Writers take turns from their first entry until commit, so seqs
+        # become visible in order and a reader never skips one in flight
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('changes'))"))
+
+
+def write_changes(session):
+    rows = session.info.pop("changes", None)
+    if not rows:
+        return
+    connection = session.connection()
+    lock_log(connection)
+    now = datetime.utcnow()
+    connection.execute(insert(Change), [
+        {"table_name": table, "row_id": id, "op": op, "changed_at": now} for table, id, op in rows
+    ])
+
+
+@event.listens_for(db.session, "after_flush")
+def write_flushed_changes(session, flush_context):
+    write_changes(session)
+
+
+@event.listens_for(db.session, "do_orm_execute")
+def queue_bulk_changes(orm_execute_state):
+    if orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in LOGGED_MODELS:
+        return
+    model, session = mapper.class_, orm_execute_state.session
+
+    if orm_execute_state.is_insert:
+        # Ids come from the INSERT itself; rows above the current max id are
+        # logged at commit
+        watermarks = session.info.setdefault("change_watermarks", {})
+        if model not in watermarks:
+            watermarks[model] = session.connection().scalar(select(func.coalesce(func.max(model.id), 0)))
+        return
+
+    op = "update" if orm_execute_state.is_update else "delete"
+    where = orm_execute_state.statement.whereclause
+    if where is None:
+        params = orm_execute_state.parameters or []
+        ids = [row["id"] for row in params if "id" in row] if isinstance(params, list) else []
+    else:
+        ids = session.connection().scalars(select(model.id).where(where)).all()
+    pending_changes(session).extend((model.__tablename__, id, op) for id in ids)
+
+
+@event.listens_for(db.session, "before_commit")
+def write_pending_changes(session):
+    session.flush()
+    write_changes(session)
+    watermarks = session.info.pop("change_watermarks", None)
+    if not watermarks:
+        return
+    connection = session.connection()
+    lock_log(connection)
+    now = datetime.utcnow()
+    for model, watermark in watermarks.items():
+        connection.execute(insert(Change).from_select(
+            ["table_name", "row_id", "op", "changed_at"],
+            select(
+                literal(model.__tablename__), model.id, literal("insert", Change.op.type), literal(now),
+            ).where(model.id > watermark),
+        ))
+
+
+@event.listens_for(db.session, "after_rollback")
+def discard_changes(session):
+    session.info.pop("changes", None)
+    session.info.pop("change_watermarks", None)
+
+
+def compaction_horizon():
+    return db.session.scalar(select(TableVersion.version).where(TableVersion.table_name == HORIZON)) or 0
+
+
+def latest_seq():
+    return max(db.session.scalar(select(func.max(Change.seq))) or 0, compaction_horizon())
+
+
+def change_feed(since, limit):
+    # Entries after since, each with the row as it is now (null once the
+    # row is gone). One query per table for the rows.
+    changes = db.session.scalars(select(Change).where(Change.seq > since).order_by(Change.seq).limit(limit)).all()
+    rows = {}
+    for model in LOGGED_MODELS:
+        ids = {change.row_id for change in changes if change.table_name == model.__tablename__}
+        if not ids:
+            continue
+        query = model.query.filter(model.id.in_(ids))
+        if model is Listing:
+            query = query.options(joinedload(Listing.game), joinedload(Listing.store))
+        serialize = fast_serializers[model]
+        rows.update(((model.__tablename__, obj.id), serialize(obj)) for obj in query)
+    return [
+        {
+            "seq": change.seq,
+            "table": change.table_name,
+            "id": change.row_id,
+            "op": change.op,
+            "changed_at": change.changed_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "data": rows.get((change.table_name, change.row_id)),
+        }
+        for change in changes
+    ]
+
+
+def stream_changes(since, batch_size=100):
+    # Server-sent events. The stream ends after CHANGE_STREAM_SECONDS so it
+    # doesn't hold a worker forever; EventSource reconnects by itself and
+    # resumes from the Last-Event-ID it sends back.
+    config = current_app.config
+    deadline = time.monotonic() + config['CHANGE_STREAM_SECONDS']
+    yield "retry: 1000\n\n"
+    while time.monotonic() < deadline:
+        if since < compaction_horizon():
+            yield "event: reset\ndata: {}\n\n"
+            return
+        entries = change_feed(since, batch_size)
+        # End the read transaction so the next poll sees new commits
+        db.session.rollback()
+        for entry in entries:
+            yield f"id: {entry['seq']}\nevent: change\ndata: {json.dumps(entry)}\n\n"
+            since = entry["seq"]
+        if len(entries) < batch_size:
+            yield ": keepalive\n\n"
+            time.sleep(config['CHANGE_STREAM_POLL'])
+
+
+def compact_changes(connection, retention):
+    # Only the newest entry per row matters to a client catching up, so
+    # older ones can go at any time
+    latest = select(func.max(Change.seq)).group_by(Change.table_name, Change.row_id)
+    connection.execute(delete(Change).where(Change.seq.not_in(latest)))
+
+    # Past the retention period deletes are dropped too, which moves the
+    # horizon: clients behind it would miss them
+    cutoff = datetime.utcnow() - retention
+    expired = (Change.op == "delete") & (Change.changed_at < cutoff)
+    horizon = connection.scalar(select(func.max(Change.seq)).where(expired))
+    if horizon is None:
+        return
+    connection.execute(delete(Change).where(expired, Change.seq <= horizon))
+    values = {"version": horizon, "updated_at": datetime.utcnow()}
+    moved = connection.execute(update(TableVersion).where(TableVersion.table_name == HORIZON).values(values))
+    if not moved.rowcount:
+        connection.execute(insert(TableVersion).values(table_name=HORIZON, **values))
+
+
+@click.command("compact-changes")
+def compact_changes_command():
+    """Drop superseded change log entries and deletes past the retention period."""
+    compact_changes(db.session.connection(), timedelta(days=current_app.config['CHANGE_RETENTION_DAYS']))
+    db.session.commit()
+
+
+def init_app(app):
+    app.config.setdefault('CHANGE_RETENTION_DAYS', int(os.environ.get('CHANGE_RETENTION_DAYS', 7)))
+    app.config.setdefault('CHANGE_STREAM_SECONDS', int(os.environ.get('CHANGE_STREAM_SECONDS', 300)))
+    app.config.setdefault('CHANGE_STREAM_POLL', float(os.environ.get('CHANGE_STREAM_POLL', 1)))
+    app.cli.add_command(compact_changes_command)
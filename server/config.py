@@ -1,29 +1,111 @@
 # Standard library imports
+import os
+import sqlite3
 
 # Remote library imports
+import click
 from flask import Flask
 from flask_cors import CORS
-from flask_migrate import Migrate
 from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, event
+
+
+def database_uri():
+    uri = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
+    # Some hosts still hand out the postgres:// scheme SQLAlchemy dropped
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    if uri in ('sqlite://', 'sqlite:///:memory:'):
+        # In-memory databases use a single static connection
+        return {}
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    }
+    if not uri.startswith('sqlite'):
+        # Drop connections the server closed while they sat in the pool
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    return options
 
-# Instantiate app, set attributes
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.json.compact = False
 
 # Define metadata, instantiate db
 metadata = MetaData(naming_convention={
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
 })
-db = SQLAlchemy(metadata=metadata)
-migrate = Migrate(app, db)
-db.init_app(app)
+# Objects keep their loaded state after commit, so a write can serialize the
+# row it just saved without reloading it
+db = SQLAlchemy(metadata=metadata, session_options={"expire_on_commit": False})
+
+# Resources are added by app.py and registered on each app by create_app
+api = Api()
+
+
+def sqlite_pragmas(app):
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in app.config['SQLITE_PRAGMAS'].items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+    return set_sqlite_pragmas
+
+
+class MigrationCommands(click.Group):
+    # "flask db ..." without importing Flask-Migrate (and Alembic) in every
+    # worker: the real command group is set up the first time it's used
+    def __init__(self, app):
+        super().__init__("db", help="Perform database migrations.")
+        self.app = app
+
+    def commands_group(self):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as commands
+
+        if "migrate" not in self.app.extensions:
+            Migrate(self.app, db)
+        return commands
+
+    def list_commands(self, ctx):
+        return self.commands_group().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.commands_group().get_command(ctx, name)
+
+
+def configure_app(config=None):
+    # Settings come from the environment; config overrides any of them
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Applied to every new SQLite connection. WAL lets readers run while a
+    # writer commits; busy_timeout makes writers wait instead of failing.
+    app.config['SQLITE_PRAGMAS'] = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+    }
+    # Flask-RESTful endpoint names served by the precompiled serializers
+    app.config['FAST_SERIALIZER_ENDPOINTS'] = {
+        'games', 'gamesbyid', 'stores', 'storesbyid', 'storesnearby', 'listings', 'listingsbyid',
+    }
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
 
-# Instantiate REST API
-api = Api(app)
+    db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "connect", sqlite_pragmas(app))
 
-# Instantiate CORS
-CORS(app)
+    app.cli.add_command(MigrationCommands(app))
+    CORS(app, expose_headers=["X-Next-Cursor", "Link"])
+    return app
@@ -0,0 +1,101 @@
+import gzip
+import os
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+# Both are optional; without them the stdlib encoder and gzip are used
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Same output as the stdlib provider: sorted keys, non-string keys turned
+# into strings and dates through Flask's default (HTTP date format)
+ORJSON_OPTIONS = (
+    orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+)
+
+# Brotli quality 4 compresses about as fast as gzip 6 and smaller
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/html", "text/plain", "text/csv")
+
+
+class JSONProvider(DefaultJSONProvider):
+    # Compact unless the app runs in debug mode (Flask's default), encoded
+    # with orjson when JSON_ENCODER is "orjson"
+    def __init__(self, app):
+        super().__init__(app)
+        self.use_orjson = app.config['JSON_ENCODER'] == "orjson"
+
+    def dumps(self, obj, **kwargs):
+        if self.use_orjson and set(kwargs) <= {"separators", "indent"}:
+            option = ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if kwargs.get("indent") else 0)
+            try:
+                return orjson.dumps(obj, default=self.default, option=option).decode()
+            except orjson.JSONEncodeError:
+                # e.g. integers wider than 64 bits, which the stdlib handles
+                pass
+        return super().dumps(obj, **kwargs)
+
+
+def output_json(data, code, headers=None):
+    # Flask-RESTful representation going through the app's provider instead
+    # of its own stdlib json.dumps
+    response = current_app.json.response(data)
+    response.status_code = code
+    response.headers.extend(headers or {})
+    return response
+
+
+def negotiate(accept_encodings, size, config):
+    # The accepted encoding with the highest quality (brotli wins ties), or
+    # None for bodies too small to be worth it
+    if size < config['COMPRESS_MIN_SIZE']:
+        return None
+    offered = [name for name in config['COMPRESS_ENCODINGS'] if name == "gzip" or name == "br" and brotli]
+    ranked = sorted(offered, key=lambda name: (accept_encodings.quality(name), name == "br"), reverse=True)
+    if ranked and accept_encodings.quality(ranked[0]) > 0:
+        return ranked[0]
+    return None
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response):
+    # Streamed responses (exports, the change stream) are left alone: they
+    # are sent as they are produced
+    if (
+        response.is_streamed or response.direct_passthrough
+        or response.status_code < 200 or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    encoding = negotiate(request.accept_encodings, len(data), current_app.config)
+    if encoding:
+        response.set_data(compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('JSON_ENCODER', os.environ.get('JSON_ENCODER', 'orjson' if orjson else 'json'))
+    app.config.setdefault('COMPRESS_MIN_SIZE', int(os.environ.get('COMPRESS_MIN_SIZE', 1024)))
+    app.config.setdefault('COMPRESS_ENCODINGS', os.environ.get('COMPRESS_ENCODINGS', 'br,gzip').split(','))
+    if app.config['JSON_ENCODER'] == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_ENCODER=orjson requires the orjson package")
+    app.json = JSONProvider(app)
+    app.after_request(compress_response)
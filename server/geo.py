@@ -0,0 +1,128 @@
+import math
+from datetime import datetime
+
+from sqlalchemy import and_, event, or_, select
+
+from config import db
+from models import Listing, Store
+
+# Stores carry a geohash of their coordinates under a plain B-tree index. A
+# nearby lookup covers its bounding box with a few geohash cells and reads
+# each cell as a prefix range, then checks the exact distance in Python.
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 9
+MAX_CELLS = 16
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 500
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    south, north, west, east = -90.0, 90.0, -180.0, 180.0
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            middle = (west + east) / 2
+            value = value * 2 + (longitude >= middle)
+            west, east = (middle, east) if longitude >= middle else (west, middle)
+        else:
+            middle = (south + north) / 2
+            value = value * 2 + (latitude >= middle)
+            south, north = (middle, north) if latitude >= middle else (south, middle)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+@event.listens_for(Store, "before_insert")
+@event.listens_for(Store, "before_update")
+def set_geohash(mapper, connection, store):
+    located = store.latitude is not None and store.longitude is not None
+    store.geohash = encode(store.latitude, store.longitude) if located else None
+
+
+def cell_size(precision):
+    # Degrees of latitude and longitude spanned by one cell
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    lat_delta = radius_km / KM_PER_DEGREE
+    lon_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+    return (
+        max(latitude - lat_delta, -90.0), max(longitude - lon_delta, -180.0),
+        min(latitude + lat_delta, 90.0), min(longitude + lon_delta, 180.0),
+    )
+
+
+def covering_prefixes(south, west, north, east):
+    # The finest precision whose cells cover the box in at most MAX_CELLS.
+    # The box is clamped at the antimeridian rather than wrapped around it.
+    for precision in range(PRECISION, 0, -1):
+        lat_size, lon_size = cell_size(precision)
+        rows = range(int((south + 90) // lat_size), int((min(north, 89.999999) + 90) // lat_size) + 1)
+        cols = range(int((west + 180) // lon_size), int((min(east, 179.999999) + 180) // lon_size) + 1)
+        if len(rows) * len(cols) <= MAX_CELLS:
+            return sorted({
+                encode(-90 + (row + 0.5) * lat_size, -180 + (col + 0.5) * lon_size, precision)
+                for row in rows for col in cols
+            })
+    return [""]
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def current_minute():
+    now = datetime.now()
+    return now.hour * 60 + now.minute
+
+
+def open_at(minute):
+    # Hours that end at or before they start run past midnight
+    return or_(
+        and_(Store.opens_at < Store.closes_at, Store.opens_at <= minute, Store.closes_at > minute),
+        and_(Store.opens_at >= Store.closes_at, or_(Store.opens_at <= minute, Store.closes_at > minute)),
+    )
+
+
+def nearby_query(latitude, longitude, radius_km, minute=None, game_id=None):
+    south, west, north, east = bounding_box(latitude, longitude, radius_km)
+    cells = [
+        and_(Store.geohash >= prefix, Store.geohash < prefix + "~")
+        for prefix in covering_prefixes(south, west, north, east)
+    ]
+    query = select(Store).where(
+        or_(*cells),
+        Store.latitude.between(south, north),
+        Store.longitude.between(west, east),
+    )
+    if minute is not None:
+        query = query.where(open_at(minute))
+    if game_id is not None:
+        query = query.where(Store.id.in_(
+            select(Listing.store_id).where(Listing.game_id == game_id, Listing.stock > 0)
+        ))
+    return query
+
+
+def nearby_stores(latitude, longitude, radius_km, minute=None, game_id=None, limit=20):
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("lat must be between -90 and 90 and lon between -180 and 180.")
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValueError(f"radius must be greater than 0 and at most {MAX_RADIUS_KM}.")
+    query = nearby_query(latitude, longitude, radius_km, minute, game_id)
+    candidates = [
+        (distance_km(latitude, longitude, store.latitude, store.longitude), store)
+        for store in db.session.scalars(query)
+    ]
+    nearby = sorted((pair for pair in candidates if pair[0] <= radius_km), key=lambda pair: pair[0])
+    return nearby[:limit]
@@ -0,0 +1,230 @@
+import os
+from datetime import datetime, time, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import delete, event, exists, func, inspect, literal, or_, select, tuple_
+from sqlalchemy.orm import aliased
+
+from caching import pending_tags
+from config import db
+from models import INSERTS, Listing, PriceHistory
+from versioning import bump_versions
+
+BUCKETS = ("hour", "day", "week", "month")
+DEFAULT_DAYS = 90
+
+SQLITE_BUCKETS = {"hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d", "month": "%Y-%m-01"}
+
+
+def bucket_expression(bucket, dialect):
+    # Start of the hour/day/week (Monday)/month each point falls in, as text
+    ts = PriceHistory.ts
+    if dialect == "postgresql":
+        return func.to_char(func.date_trunc(bucket, ts), "YYYY-MM-DD HH24:00" if bucket == "hour" else "YYYY-MM-DD")
+    if bucket == "week":
+        return func.date(ts, "weekday 0", "-6 days")
+    return func.strftime(SQLITE_BUCKETS[bucket], ts)
+
+
+def parse_bucket(value, default=None):
+    if value is None or value == "":
+        return default
+    if value not in BUCKETS:
+        raise ValueError(f"bucket must be one of: {', '.join(BUCKETS)}")
+    return value
+
+
+def record_points(connection, where=None):
+    # One point per matching listing with its current price and stock,
+    # unless its latest point already has them
+    latest = aliased(PriceHistory)
+    latest_ts = select(func.max(PriceHistory.ts)).where(PriceHistory.listing_id == Listing.id).scalar_subquery()
+    unchanged = exists().where(
+        latest.listing_id == Listing.id, latest.ts == latest_ts,
+        latest.price.is_not_distinct_from(Listing.price), latest.stock == Listing.stock,
+    )
+    query = select(Listing.id, literal(datetime.utcnow(), PriceHistory.ts.type), Listing.price, Listing.stock)
+    query = query.where(~unchanged)
+    if where is not None:
+        query = query.where(where)
+    # Two commits on one listing can get the same timestamp (coarse clocks);
+    # the later point replaces the earlier one
+    statement = INSERTS[connection.dialect.name](PriceHistory).from_select(["listing_id", "ts", "price", "stock"], query)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[PriceHistory.listing_id, PriceHistory.ts],
+        set_={"price": statement.excluded.price, "stock": statement.excluded.stock},
+    ))
+
+
+def pending_listings(session):
+    return session.info.setdefault("price_history", set())
+
+
+def forget_listings(connection, where):
+    # Points go with their listing. Postgres cascades on its own; SQLite
+    # doesn't enforce foreign keys here.
+    connection.execute(delete(PriceHistory).where(PriceHistory.listing_id.in_(select(Listing.id).where(where))))
+
+
+@event.listens_for(db.session, "after_flush")
+def collect_flushed_listings(session, flush_context):
+    ids = pending_listings(session)
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Listing):
+            continue
+        state = inspect(obj)
+        if obj in session.new or state.attrs.price.history.has_changes() or state.attrs.stock.history.has_changes():
+            ids.add(obj.id)
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Listing)]
+    if deleted:
+        session.connection().execute(delete(PriceHistory).where(PriceHistory.listing_id.in_(deleted)))
+
+
+@event.listens_for(db.session, "do_orm_execute")
+def collect_bulk_listings(orm_execute_state):
+    if orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not Listing:
+        return
+    session = orm_execute_state.session
+    connection = session.connection()
+
+    if orm_execute_state.is_insert:
+        # New rows are above the current max id; recorded at commit
+        if "price_history_watermark" not in session.info:
+            session.info["price_history_watermark"] = connection.scalar(select(func.coalesce(func.max(Listing.id), 0)))
+        return
+
+    where = orm_execute_state.statement.whereclause
+    if where is None:
+        # UPDATE by primary key with one parameter set per row
+        params = orm_execute_state.parameters or []
+        rows = params if isinstance(params, list) else []
+        if orm_execute_state.is_update:
+            rows = [row for row in rows if "price" in row or "stock" in row]
+        where = Listing.id.in_([row["id"] for row in rows if "id" in row])
+    if orm_execute_state.is_delete:
+        forget_listings(connection, where)
+    else:
+        pending_listings(session).update(connection.scalars(select(Listing.id).where(where)))
+
+
+@event.listens_for(db.session, "before_commit")
+def write_price_history(session):
+    session.flush()
+    ids = session.info.pop("price_history", None)
+    watermark = session.info.pop("price_history_watermark", None)
+    matched = []
+    if ids:
+        matched.append(Listing.id.in_(ids))
+    if watermark is not None:
+        matched.append(Listing.id > watermark)
+    if matched:
+        record_points(session.connection(), or_(*matched))
+
+
+@event.listens_for(db.session, "after_rollback")
+def discard_price_history(session):
+    session.info.pop("price_history", None)
+    session.info.pop("price_history_watermark", None)
+
+
+def format_ts(ts):
+    return ts.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def bucket_row(bucket, points, min_price, avg_price, max_price):
+    return {
+        "bucket": bucket,
+        "points": points,
+        "min_price": min_price,
+        "avg_price": round(avg_price, 2) if avg_price is not None else None,
+        "max_price": max_price,
+    }
+
+
+def listing_history(listing_id, bucket=None, days=DEFAULT_DAYS, limit=None):
+    # Raw points newest first, or one row per bucket oldest first
+    since = datetime.utcnow() - timedelta(days=days)
+    in_range = (PriceHistory.listing_id == listing_id) & (PriceHistory.ts >= since)
+    if bucket is None:
+        rows = db.session.execute(
+            select(PriceHistory.ts, PriceHistory.price, PriceHistory.stock)
+            .where(in_range).order_by(PriceHistory.ts.desc()).limit(limit)
+        )
+        points = [{"ts": format_ts(ts), "price": price, "stock": stock} for ts, price, stock in rows]
+        return {"listing_id": listing_id, "points": points}
+
+    label = bucket_expression(bucket, db.session.get_bind().dialect.name)
+    rows = db.session.execute(
+        select(
+            label, func.count(), func.min(PriceHistory.price), func.avg(PriceHistory.price), func.max(PriceHistory.price),
+        ).where(in_range).group_by(label).order_by(label)
+    )
+    return {"listing_id": listing_id, "bucket": bucket, "points": [bucket_row(*row) for row in rows]}
+
+
+def trend_query(game_id, bucket, since, dialect):
+    # Price points of every listing of the game, one row per bucket
+    label = bucket_expression(bucket, dialect)
+    return (
+        select(
+            label, func.count(PriceHistory.listing_id.distinct()), func.count(),
+            func.min(PriceHistory.price), func.avg(PriceHistory.price), func.max(PriceHistory.price),
+        )
+        .join(Listing, Listing.id == PriceHistory.listing_id)
+        .where(Listing.game_id == game_id, PriceHistory.ts >= since)
+        .group_by(label).order_by(label)
+    )
+
+
+def game_price_trend(game_id, bucket="day", days=DEFAULT_DAYS):
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.session.execute(trend_query(game_id, bucket, since, db.session.get_bind().dialect.name))
+    trend = [{**bucket_row(name, *stats), "listings": listings} for name, listings, *stats in rows]
+    return {"game_id": game_id, "bucket": bucket, "trend": trend}
+
+
+def compact_history(session, raw_days, retention_days):
+    now = datetime.utcnow()
+    ts = PriceHistory.ts
+
+    # Past the retention period only each listing's latest point is kept,
+    # so every listing still has a current one
+    latest = select(PriceHistory.listing_id, func.max(ts)).group_by(PriceHistory.listing_id)
+    expired = ts < now - timedelta(days=retention_days)
+    removed = session.execute(
+        delete(PriceHistory).where(expired, tuple_(PriceHistory.listing_id, ts).not_in(latest))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    # Older than raw_days, whole days roll up to their last point
+    cutoff = datetime.combine((now - timedelta(days=raw_days)).date(), time.min)
+    day = bucket_expression("day", session.get_bind().dialect.name)
+    closing = select(PriceHistory.listing_id, func.max(ts)).where(ts < cutoff).group_by(PriceHistory.listing_id, day)
+    removed += session.execute(
+        delete(PriceHistory).where(ts < cutoff, tuple_(PriceHistory.listing_id, ts).not_in(closing))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    if removed:
+        # History and trend responses are cached and versioned as listings
+        # reads; drop them at commit like any other listings write
+        pending_tags(session).add("listings:*")
+        bump_versions(session.connection(), {"listings"})
+
+
+@click.command("compact-history")
+def compact_history_command():
+    """Roll old price history up to one point per day and drop points past the retention period."""
+    config = current_app.config
+    compact_history(db.session, config['HISTORY_RAW_DAYS'], config['HISTORY_RETENTION_DAYS'])
+    db.session.commit()
+
+
+def init_app(app):
+    app.config.setdefault('HISTORY_RAW_DAYS', int(os.environ.get('HISTORY_RAW_DAYS', 30)))
+    app.config.setdefault('HISTORY_RETENTION_DAYS', int(os.environ.get('HISTORY_RETENTION_DAYS', 365)))
+    app.cli.add_command(compact_history_command)
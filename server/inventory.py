@@ -0,0 +1,190 @@
+import os
+
+import click
+from flask import current_app
+from sqlalchemy import case, delete, distinct, event, func, insert, inspect, select
+
+from config import db
+from models import Listing, GameOfferStats, StoreInventoryStats
+
+NEW = func.sum(case((Listing.condition == "New", 1), else_=0))
+USED = func.sum(case((Listing.condition == "Used", 1), else_=0))
+
+GAME_STATS = (
+    func.count(Listing.id), func.min(Listing.price), func.avg(Listing.price), func.max(Listing.price),
+    func.coalesce(func.sum(Listing.stock), 0), NEW, USED,
+)
+GAME_FIELDS = ("listing_count", "min_price", "avg_price", "max_price", "total_stock", "new_count", "used_count")
+
+STORE_STATS = (
+    func.count(Listing.id), func.count(distinct(Listing.game_id)),
+    func.coalesce(func.sum(Listing.stock), 0), NEW, USED,
+)
+STORE_FIELDS = ("listing_count", "game_count", "total_stock", "new_count", "used_count")
+
+
+def summary_enabled():
+    return current_app.config['INVENTORY_SUMMARY']
+
+
+def game_row(game_id, values):
+    data = {"game_id": game_id, **dict(zip(GAME_FIELDS, values))}
+    if data["avg_price"] is not None:
+        data["avg_price"] = round(data["avg_price"], 2)
+    return data
+
+
+def store_row(store_id, values):
+    return {"store_id": store_id, **dict(zip(STORE_FIELDS, values))}
+
+
+def empty_game(game_id):
+    return game_row(game_id, (0, None, None, None, 0, 0, 0))
+
+
+def empty_store(store_id):
+    return store_row(store_id, (0, 0, 0, 0, 0))
+
+
+def game_offers(game_id):
+    if summary_enabled():
+        stats = db.session.get(GameOfferStats, game_id)
+        values = [getattr(stats, field) for field in GAME_FIELDS] if stats else None
+    else:
+        values = db.session.execute(select(*GAME_STATS).where(Listing.game_id == game_id)).one()
+    return game_row(game_id, values) if values and values[0] else empty_game(game_id)
+
+
+def store_inventory(store_id):
+    if summary_enabled():
+        stats = db.session.get(StoreInventoryStats, store_id)
+        values = [getattr(stats, field) for field in STORE_FIELDS] if stats else None
+    else:
+        values = db.session.execute(select(*STORE_STATS).where(Listing.store_id == store_id)).one()
+    return store_row(store_id, values) if values and values[0] else empty_store(store_id)
+
+
+def catalog_stats():
+    if summary_enabled():
+        games = [
+            game_row(stats.game_id, [getattr(stats, field) for field in GAME_FIELDS])
+            for stats in GameOfferStats.query.order_by(GameOfferStats.game_id)
+        ]
+        stores = [
+            store_row(stats.store_id, [getattr(stats, field) for field in STORE_FIELDS])
+            for stats in StoreInventoryStats.query.order_by(StoreInventoryStats.store_id)
+        ]
+    else:
+        games = [
+            game_row(game_id, values)
+            for game_id, *values in db.session.execute(
+                select(Listing.game_id, *GAME_STATS).where(Listing.game_id.isnot(None))
+                .group_by(Listing.game_id).order_by(Listing.game_id)
+            )
+        ]
+        stores = [
+            store_row(store_id, values)
+            for store_id, *values in db.session.execute(
+                select(Listing.store_id, *STORE_STATS).where(Listing.store_id.isnot(None))
+                .group_by(Listing.store_id).order_by(Listing.store_id)
+            )
+        ]
+    conditions = {
+        "New": sum(store["new_count"] for store in stores),
+        "Used": sum(store["used_count"] for store in stores),
+    }
+    return {"games": games, "stores": stores, "conditions": conditions}
+
+
+def refresh_summaries(connection, game_ids=None, store_ids=None):
+    # Recompute the given keys (or everything when None) with GROUP BY over
+    # the indexed game_id/store_id columns
+    for model, key, column, stats, fields, ids in (
+        (GameOfferStats, "game_id", Listing.game_id, GAME_STATS, GAME_FIELDS, game_ids),
+        (StoreInventoryStats, "store_id", Listing.store_id, STORE_STATS, STORE_FIELDS, store_ids),
+    ):
+        if ids is not None and not ids:
+            continue
+        query = select(column, *stats).where(column.isnot(None)).group_by(column)
+        clear = delete(model)
+        if ids is not None:
+            query = query.where(column.in_(ids))
+            clear = clear.where(getattr(model, key).in_(ids))
+        connection.execute(clear)
+        connection.execute(insert(model).from_select([key, *fields], query))
+
+
+def pending_keys(session):
+    return session.info.setdefault("inventory_keys", (set(), set()))
+
+
+@event.listens_for(db.session, "after_flush")
+def collect_flushed_keys(session, flush_context):
+    if not summary_enabled():
+        return
+    game_ids, store_ids = pending_keys(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Listing):
+            continue
+        state = inspect(obj)
+        game_ids.update([obj.game_id, *state.attrs.game_id.history.deleted])
+        store_ids.update([obj.store_id, *state.attrs.store_id.history.deleted])
+
+
+@event.listens_for(db.session, "do_orm_execute")
+def collect_bulk_keys(orm_execute_state):
+    if not summary_enabled() or orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not Listing:
+        return
+    game_ids, store_ids = pending_keys(orm_execute_state.session)
+
+    # New parents from the statement parameters
+    params = orm_execute_state.parameters or []
+    for row in params if isinstance(params, list) else [params]:
+        game_ids.add(row.get("game_id"))
+        store_ids.add(row.get("store_id"))
+
+    # Old parents of the rows an UPDATE/DELETE is about to touch
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        where = orm_execute_state.statement.whereclause
+        if where is None:
+            ids = [row["id"] for row in params if "id" in row] if isinstance(params, list) else []
+            where = Listing.id.in_(ids)
+        for game_id, store_id in orm_execute_state.session.connection().execute(
+            select(Listing.game_id, Listing.store_id).where(where).distinct()
+        ):
+            game_ids.add(game_id)
+            store_ids.add(store_id)
+
+
+@event.listens_for(db.session, "before_commit")
+def refresh_pending(session):
+    if not summary_enabled():
+        return
+    session.flush()
+    game_ids, store_ids = session.info.pop("inventory_keys", (set(), set()))
+    game_ids.discard(None)
+    store_ids.discard(None)
+    if game_ids or store_ids:
+        refresh_summaries(session.connection(), game_ids, store_ids)
+
+
+@event.listens_for(db.session, "after_rollback")
+def discard_pending(session):
+    session.info.pop("inventory_keys", None)
+
+
+@click.command("rebuild-summaries")
+def rebuild_summaries_command():
+    """Rebuild the inventory summary tables from listings."""
+    refresh_summaries(db.session.connection())
+    db.session.commit()
+
+
+def init_app(app):
+    # When enabled, listing writes keep game_offer_stats / store_inventory_stats
+    # up to date and the read endpoints use them instead of scanning listings
+    app.config.setdefault('INVENTORY_SUMMARY', os.environ.get('INVENTORY_SUMMARY', '').lower() in ('1', 'true', 'yes'))
+    app.cli.add_command(rebuild_summaries_command)
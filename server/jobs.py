@@ -0,0 +1,104 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import insert
+
+from changes import compact_changes
+from config import db
+from history import compact_history
+from inventory import refresh_summaries
+from models import Job, Listing
+from search import rebuild_search_index
+
+# Work too slow for a request runs on a small thread pool in the worker
+# process; its status lives in the jobs table so any worker can report it
+JOBS = {}
+
+# The jobs POST /jobs can start; the rest are started by their own routes
+MAINTENANCE_JOBS = ("rebuild-summaries", "rebuild-search-index", "compact-changes", "compact-history")
+
+
+def job(name):
+    def decorator(fn):
+        JOBS[name] = fn
+        return fn
+    return decorator
+
+
+@job("rebuild-summaries")
+def rebuild_summaries(params):
+    refresh_summaries(db.session.connection())
+    db.session.commit()
+
+
+@job("rebuild-search-index")
+def rebuild_search(params):
+    rebuild_search_index(db.session.connection())
+    db.session.commit()
+
+
+@job("compact-changes")
+def compact(params):
+    compact_changes(db.session.connection(), timedelta(days=current_app.config['CHANGE_RETENTION_DAYS']))
+    db.session.commit()
+
+
+@job("compact-history")
+def compact_price_history(params):
+    config = current_app.config
+    compact_history(db.session, config['HISTORY_RAW_DAYS'], config['HISTORY_RETENTION_DAYS'])
+    db.session.commit()
+
+
+@job("import-listings")
+def import_listings(params):
+    # Rows already validated by POST /listings/bulk. Each batch commits on
+    # its own so request writes get the write lock in between.
+    rows, size = params["rows"], current_app.config['JOB_BATCH_SIZE']
+    created = []
+    for start in range(0, len(rows), size):
+        created += db.session.scalars(insert(Listing).returning(Listing.id), rows[start:start + size]).all()
+        db.session.commit()
+    return {"created": created}
+
+
+def run_job(app, id, params):
+    with app.app_context():
+        job = db.session.get(Job, id)
+        job.status, job.started_at = "running", datetime.utcnow()
+        db.session.commit()
+        try:
+            job.result = JOBS[job.name](params)
+            job.status = "done"
+        except Exception as e:
+            app.logger.exception("Job %s (%s) failed", id, job.name)
+            db.session.rollback()
+            job.status, job.error = "failed", str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+def submit_job(name, params=None):
+    job = Job(name=name, status="queued")
+    db.session.add(job)
+    db.session.commit()
+    current_app.extensions['job_pool'].submit(run_job, current_app._get_current_object(), job.id, params or {})
+    return job
+
+
+def job_to_dict(job):
+    times = {
+        key: value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+        for key, value in (("created_at", job.created_at), ("started_at", job.started_at), ("finished_at", job.finished_at))
+    }
+    return {"id": job.id, "name": job.name, "status": job.status, "result": job.result, "error": job.error, **times}
+
+
+def init_app(app):
+    app.config.setdefault('JOB_WORKERS', int(os.environ.get('JOB_WORKERS', 2)))
+    app.config.setdefault('JOB_BATCH_SIZE', int(os.environ.get('JOB_BATCH_SIZE', 1000)))
+    # Threads start with the first job, so a preloading gunicorn master forks
+    # without any
+    app.extensions['job_pool'] = ThreadPoolExecutor(app.config['JOB_WORKERS'], thread_name_prefix="job")
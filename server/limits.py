@@ -0,0 +1,152 @@
+import hashlib
+import math
+import os
+import time
+from collections import OrderedDict
+from threading import BoundedSemaphore, Lock
+
+from flask import current_app, g, request
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+EXEMPT_ENDPOINTS = ("metrics",)
+
+# Token buckets: each client gets `burst` requests up front, refilled at
+# `rate` per second. Reads and writes have separate buckets.
+
+
+class LocalBuckets:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.buckets = OrderedDict()
+        self.lock = Lock()
+
+    def take(self, key, rate, burst):
+        # Seconds until a token is available; 0 when one was taken
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            self.buckets[key] = (tokens - 1 if not wait else tokens, now)
+            # The least recently used bucket goes first; an idle one is full anyway
+            while len(self.buckets) > self.max_entries:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class RedisBuckets:
+    # Shared by every gunicorn worker; the script refills and takes in one step
+    SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = math.min(burst, (tonumber(bucket[1]) or burst) + math.max(0, now - (tonumber(bucket[2]) or now)) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+    def __init__(self, url, prefix="gamenest:limits:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+        self.prefix = prefix
+
+    def take(self, key, rate, burst):
+        return float(self.script(keys=[self.prefix + key], args=[rate, burst, time.time()]))
+
+
+class AdmissionGate:
+    # At most `limit` writes run at once in this process. Up to `max_queue`
+    # more wait, for at most `timeout` seconds; the rest are turned away
+    # right away instead of piling up behind the database
+    def __init__(self, limit, max_queue, timeout):
+        self.slots = BoundedSemaphore(limit)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.waiting = 0
+        self.lock = Lock()
+
+    def enter(self):
+        if self.slots.acquire(blocking=False):
+            return True
+        with self.lock:
+            if self.waiting >= self.max_queue:
+                return False
+            self.waiting += 1
+        try:
+            return self.slots.acquire(timeout=self.timeout)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def leave(self):
+        self.slots.release()
+
+
+def make_buckets(config):
+    if config['RATE_LIMIT_URL']:
+        return RedisBuckets(config['RATE_LIMIT_URL'])
+    return LocalBuckets()
+
+
+def client_key():
+    # Known API keys get their own budget; anyone else is limited by address
+    api_key = request.headers.get("X-API-Key")
+    if api_key and api_key in current_app.config['RATE_LIMIT_API_KEYS']:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return "addr:" + (request.remote_addr or "unknown")
+
+
+def rejected(message, status, retry_after):
+    return {'errors': message}, status, {'Retry-After': str(max(1, math.ceil(retry_after)))}
+
+
+def limit_request():
+    if request.method == "OPTIONS" or request.endpoint in EXEMPT_ENDPOINTS:
+        return None
+    config = current_app.config
+    kind = "write" if request.method in WRITE_METHODS else "read"
+    rate = config[f'RATE_LIMIT_{kind.upper()}S']
+    if rate > 0:
+        burst = max(1, config[f'RATE_LIMIT_{kind.upper()}_BURST'] or rate)
+        wait = current_app.extensions['rate_limits'].take(f"{kind}:{client_key()}", rate, burst)
+        if wait:
+            return rejected('Too many requests; retry later.', 429, wait)
+
+    gate = current_app.extensions['admission_gate']
+    if kind == "write" and gate is not None:
+        if not gate.enter():
+            return rejected('Server is busy; retry later.', 503, 1)
+        g.admitted = True
+    return None
+
+
+def release(exc):
+    if g.pop("admitted", False):
+        current_app.extensions['admission_gate'].leave()
+
+
+def init_app(app):
+    # Requests per second per client; 0 turns the limit off. Bursts default
+    # to one second's worth.
+    app.config.setdefault('RATE_LIMIT_READS', float(os.environ.get('RATE_LIMIT_READS', 0)))
+    app.config.setdefault('RATE_LIMIT_READ_BURST', int(os.environ.get('RATE_LIMIT_READ_BURST', 0)))
+    app.config.setdefault('RATE_LIMIT_WRITES', float(os.environ.get('RATE_LIMIT_WRITES', 0)))
+    app.config.setdefault('RATE_LIMIT_WRITE_BURST', int(os.environ.get('RATE_LIMIT_WRITE_BURST', 0)))
+    app.config.setdefault('RATE_LIMIT_URL', os.environ.get('RATE_LIMIT_URL'))
+    app.config.setdefault('RATE_LIMIT_API_KEYS', set(filter(None, os.environ.get('RATE_LIMIT_API_KEYS', '').split(','))))
+    # Concurrent writes per process; 0 turns the gate off
+    app.config.setdefault('ADMISSION_MAX_WRITES', int(os.environ.get('ADMISSION_MAX_WRITES', 0)))
+    app.config.setdefault('ADMISSION_MAX_QUEUE', int(os.environ.get('ADMISSION_MAX_QUEUE', 16)))
+    app.config.setdefault('ADMISSION_TIMEOUT', float(os.environ.get('ADMISSION_TIMEOUT', 2)))
+
+    app.extensions['rate_limits'] = make_buckets(app.config)
+    max_writes = app.config['ADMISSION_MAX_WRITES']
+    app.extensions['admission_gate'] = AdmissionGate(
+        max_writes, app.config['ADMISSION_MAX_QUEUE'], app.config['ADMISSION_TIMEOUT'],
+    ) if max_writes > 0 else None
+    app.before_request(limit_request)
+    app.teardown_request(release)
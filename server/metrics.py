@@ -0,0 +1,155 @@
+import os
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from flask import current_app, g, request, has_request_context, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from caching import response_cache
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    # Per-process: each gunicorn worker reports its own series
+    def __init__(self):
+        self.lock = Lock()
+        self.histograms = {}
+        self.requests = {}
+
+    def record(self, route, method, status, wall, sql_count, sql_time, serialize_time):
+        with self.lock:
+            self.requests[(route, method, status)] = self.requests.get((route, method, status), 0) + 1
+            for name, buckets, value in (
+                ("request_duration_seconds", SECONDS_BUCKETS, wall),
+                ("sql_statements", COUNT_BUCKETS, sql_count),
+                ("sql_duration_seconds", SECONDS_BUCKETS, sql_time),
+                ("serialization_duration_seconds", SECONDS_BUCKETS, serialize_time),
+            ):
+                key = (name, route, method)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(buckets)
+                self.histograms[key].observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            lines.append("# TYPE gamenest_requests_total counter")
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'gamenest_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+
+            for name in sorted({key[0] for key in self.histograms}):
+                lines.append(f"# TYPE gamenest_{name} histogram")
+                for (metric, route, method), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    labels = f'route="{route}",method="{method}"'
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'gamenest_{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'gamenest_{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f"gamenest_{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"gamenest_{name}_count{{{labels}}} {histogram.count}")
+
+        stats = response_cache().stats()
+        for name in ("hits", "misses", "evictions", "invalidations"):
+            lines.append(f"# TYPE gamenest_cache_{name}_total counter")
+            lines.append(f"gamenest_cache_{name}_total {stats[name]}")
+        if "size" in stats:
+            lines.append("# TYPE gamenest_cache_entries gauge")
+            lines.append(f"gamenest_cache_entries {stats['size']}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def current():
+    if has_request_context():
+        return g.get("request_metrics")
+    return None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_start", []).append(time.perf_counter())
+
+
+def finish_statement(conn):
+    started = conn.info["statement_start"].pop()
+    metrics = current()
+    if metrics is not None:
+        metrics["sql_count"] += 1
+        metrics["sql_time"] += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def end_statement(conn, cursor, statement, parameters, context, executemany):
+    finish_statement(conn)
+
+
+@event.listens_for(Engine, "handle_error")
+def fail_statement(exception_context):
+    # A statement that raises never reaches after_cursor_execute. Errors
+    # before the cursor ran (connecting, binding) have no start to pop.
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("statement_start"):
+        finish_statement(conn)
+
+
+def record_serialization(seconds):
+    metrics = current()
+    if metrics is not None:
+        metrics["serialize_time"] += seconds
+
+
+def start_request():
+    g.request_metrics = {"start": time.perf_counter(), "sql_count": 0, "sql_time": 0.0, "serialize_time": 0.0}
+
+
+def finish_request(response):
+    metrics = g.pop("request_metrics", None)
+    if metrics is None or request.endpoint == "metrics":
+        return response
+
+    wall = time.perf_counter() - metrics["start"]
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    registry.record(
+        route, request.method, response.status_code,
+        wall, metrics["sql_count"], metrics["sql_time"], metrics["serialize_time"],
+    )
+    if current_app.config['SERVER_TIMING']:
+        response.headers["Server-Timing"] = (
+            f'app;dur={wall * 1000:.2f}, '
+            f'db;dur={metrics["sql_time"] * 1000:.2f};desc="{metrics["sql_count"]} queries", '
+            f'serialize;dur={metrics["serialize_time"] * 1000:.2f}'
+        )
+    return response
+
+
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    app.config.setdefault('SERVER_TIMING', os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes'))
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.add_url_rule('/metrics', view_func=metrics)
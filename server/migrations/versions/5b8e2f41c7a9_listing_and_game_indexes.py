@@ -0,0 +1,34 @@
+"""listing and game indexes
+
+Revision ID: 5b8e2f41c7a9
+Revises: d316f025ec73
+Create Date: 2026-10-18 10:12:44.120391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2f41c7a9'
+down_revision = 'd316f025ec73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_games_console', 'games', [sa.text('lower(console)')], unique=False)
+    op.create_index('ix_games_genre', 'games', [sa.text('lower(genre)')], unique=False)
+    op.create_index('ix_games_rating', 'games', [sa.text('lower(rating)')], unique=False)
+    op.create_index('ix_listings_created_at_id', 'listings', ['created_at', 'id'], unique=False)
+    op.create_index('ix_listings_game_id_created_at', 'listings', ['game_id', 'created_at'], unique=False)
+    op.create_index('ix_listings_store_id_created_at', 'listings', ['store_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_listings_store_id_created_at', table_name='listings')
+    op.drop_index('ix_listings_game_id_created_at', table_name='listings')
+    op.drop_index('ix_listings_created_at_id', table_name='listings')
+    op.drop_index('ix_games_rating', table_name='games')
+    op.drop_index('ix_games_genre', table_name='games')
+    op.drop_index('ix_games_console', table_name='games')
@@ -0,0 +1,49 @@
+"""updated_at columns and table versions
+
+Revision ID: 9a3d6c0e5f12
+Revises: 5b8e2f41c7a9
+Create Date: 2026-10-18 11:02:15.384027
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a3d6c0e5f12'
+down_revision = '5b8e2f41c7a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('games', 'stores', 'listings'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP")
+
+    table_versions = op.create_table('table_versions',
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.bulk_insert(table_versions, [
+        {'table_name': table, 'version': 0, 'updated_at': datetime.utcnow()}
+        for table in ('games', 'stores', 'listings')
+    ])
+
+
+def downgrade():
+    op.drop_table('table_versions')
+    # Batch mode recreates the table on SQLite and can't reflect expression
+    # indexes, so drop and rebuild them around it
+    for column in ('console', 'genre', 'rating'):
+        op.drop_index(f'ix_games_{column}', table_name='games')
+    for table in ('listings', 'stores', 'games'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
+    for column in ('console', 'genre', 'rating'):
+        op.create_index(f'ix_games_{column}', 'games', [sa.text(f'lower({column})')], unique=False)
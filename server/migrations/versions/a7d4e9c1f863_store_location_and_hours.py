@@ -0,0 +1,63 @@
+"""store location and hours
+
+Revision ID: a7d4e9c1f863
+Revises: f3a8c5d2b716
+Create Date: 2026-10-18 20:05:37.218604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4e9c1f863'
+down_revision = 'f3a8c5d2b716'
+branch_labels = None
+depends_on = None
+
+
+def opening_minutes(hours):
+    # Same parsing as models.opening_minutes; unparseable hours stay NULL
+    try:
+        times = [time.split(":") for time in hours.replace(" ", "").split("-")]
+        opens, closes = (
+            int(t[0]) * 60 + (min(int(t[1]), 59) if len(t) > 1 and t[1].isdigit() else 0) for t in times
+        )
+    except (ValueError, AttributeError):
+        return None, None
+    return opens, closes
+
+
+def upgrade():
+    with op.batch_alter_table('stores', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('opens_at', sa.SmallInteger(), nullable=True))
+        batch_op.add_column(sa.Column('closes_at', sa.SmallInteger(), nullable=True))
+        batch_op.add_column(sa.Column('geohash', sa.String(), nullable=True))
+        batch_op.create_index('ix_stores_geohash', ['geohash'], unique=False)
+
+    # Coordinates can't be derived from the address strings, so existing
+    # stores only show up in /stores/nearby once they are given some
+    connection = op.get_bind()
+    stores = sa.table('stores', sa.column('id'), sa.column('hours'), sa.column('opens_at'), sa.column('closes_at'))
+    rows = []
+    for id, hours in connection.execute(sa.select(stores.c.id, stores.c.hours)):
+        opens_at, closes_at = opening_minutes(hours)
+        rows.append({'store_id': id, 'opens_at': opens_at, 'closes_at': closes_at})
+    if rows:
+        connection.execute(
+            stores.update().where(stores.c.id == sa.bindparam('store_id'))
+            .values(opens_at=sa.bindparam('opens_at'), closes_at=sa.bindparam('closes_at')),
+            rows,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('stores', schema=None) as batch_op:
+        batch_op.drop_index('ix_stores_geohash')
+        batch_op.drop_column('geohash')
+        batch_op.drop_column('closes_at')
+        batch_op.drop_column('opens_at')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
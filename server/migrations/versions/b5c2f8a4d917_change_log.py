@@ -0,0 +1,35 @@
+"""change log
+
+Revision ID: b5c2f8a4d917
+Revises: a7d4e9c1f863
+Create Date: 2026-10-18 20:48:02.671539
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5c2f8a4d917'
+down_revision = 'a7d4e9c1f863'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('changes',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.SmallInteger(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('seq'),
+    sqlite_autoincrement=True
+    )
+    op.create_index('ix_changes_table_name_row_id', 'changes', ['table_name', 'row_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_changes_table_name_row_id', table_name='changes')
+    op.drop_table('changes')
+    op.execute("DELETE FROM table_versions WHERE table_name = 'changes'")
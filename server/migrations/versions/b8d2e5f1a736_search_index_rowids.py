@@ -0,0 +1,45 @@
+"""search index rowids
+
+Revision ID: b8d2e5f1a736
+Revises: f7c2d9e4b168
+Create Date: 2026-10-19 11:04:37.418265
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d2e5f1a736'
+down_revision = 'f7c2d9e4b168'
+branch_labels = None
+depends_on = None
+
+# Copy of search.GAME_DOCUMENTS with the SQLite rowid (ref_id * 2 + 0 for
+# games, + 1 for stores)
+GAME_DOCUMENTS = (
+    "SELECT games.id * 2, 'game', games.id, games.title, "
+    "trim(coalesce(genres.name, '') || ' ' || coalesce(group_concat(consoles.name, ' '), '')) "
+    "FROM games LEFT JOIN genres ON genres.id = games.genre_id "
+    "LEFT JOIN game_consoles ON game_consoles.game_id = games.id "
+    "LEFT JOIN consoles ON consoles.id = game_consoles.console_id "
+    "GROUP BY games.id, games.title, genres.name"
+)
+
+
+def upgrade():
+    # FTS5 documents were removed by their UNINDEXED kind and ref_id, a scan
+    # of the whole index; reinsert them keyed by rowid. Postgres already
+    # indexes (kind, ref_id).
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DELETE FROM search_index")
+    op.execute("INSERT INTO search_index (rowid, kind, ref_id, title, body) " + GAME_DOCUMENTS)
+    op.execute(
+        "INSERT INTO search_index (rowid, kind, ref_id, title, body) "
+        "SELECT id * 2 + 1, 'store', id, name, location FROM stores"
+    )
+
+
+def downgrade():
+    # The previous code never relies on the rowids, so they can stay
+    pass
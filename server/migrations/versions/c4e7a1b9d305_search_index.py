@@ -0,0 +1,47 @@
+"""search index
+
+Revision ID: c4e7a1b9d305
+Revises: 9a3d6c0e5f12
+Create Date: 2026-10-18 12:20:51.904716
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e7a1b9d305'
+down_revision = '9a3d6c0e5f12'
+branch_labels = None
+depends_on = None
+
+GAME_DOCUMENT = "coalesce(title, '') || ' ' || coalesce(genre, '') || ' ' || coalesce(console, '')"
+STORE_DOCUMENT = "coalesce(name, '') || ' ' || coalesce(location, '')"
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(f"CREATE INDEX ix_games_search ON games USING gin (to_tsvector('simple', {GAME_DOCUMENT}))")
+        op.execute(f"CREATE INDEX ix_stores_search ON stores USING gin (to_tsvector('simple', {STORE_DOCUMENT}))")
+        return
+
+    op.execute(
+        "CREATE VIRTUAL TABLE search_index "
+        "USING fts5(kind UNINDEXED, ref_id UNINDEXED, title, body, tokenize='unicode61')"
+    )
+    op.execute(
+        "INSERT INTO search_index (kind, ref_id, title, body) "
+        "SELECT 'game', id, title, trim(coalesce(genre, '') || ' ' || coalesce(console, '')) FROM games"
+    )
+    op.execute(
+        "INSERT INTO search_index (kind, ref_id, title, body) "
+        "SELECT 'store', id, name, location FROM stores"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_stores_search', table_name='stores')
+        op.drop_index('ix_games_search', table_name='games')
+        return
+
+    op.execute("DROP TABLE search_index")
@@ -0,0 +1,30 @@
+"""listing version
+
+Revision ID: c8e1d4b7a2f5
+Revises: b5c2f8a4d917
+Create Date: 2026-10-18 22:14:06.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e1d4b7a2f5'
+down_revision = 'b5c2f8a4d917'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows start at version 1, like new ones
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.alter_column('version', server_default=None)
+
+
+def downgrade():
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.drop_column('version')
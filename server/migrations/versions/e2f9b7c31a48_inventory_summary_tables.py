@@ -0,0 +1,60 @@
+"""inventory summary tables
+
+Revision ID: e2f9b7c31a48
+Revises: c4e7a1b9d305
+Create Date: 2026-10-18 13:05:27.516093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f9b7c31a48'
+down_revision = 'c4e7a1b9d305'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('game_offer_stats',
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('listing_count', sa.Integer(), nullable=False),
+    sa.Column('min_price', sa.Float(), nullable=True),
+    sa.Column('avg_price', sa.Float(), nullable=True),
+    sa.Column('max_price', sa.Float(), nullable=True),
+    sa.Column('total_stock', sa.Integer(), nullable=False),
+    sa.Column('new_count', sa.Integer(), nullable=False),
+    sa.Column('used_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['game_id'], ['games.id'], name=op.f('fk_game_offer_stats_game_id_games'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('game_id')
+    )
+    op.create_table('store_inventory_stats',
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('listing_count', sa.Integer(), nullable=False),
+    sa.Column('game_count', sa.Integer(), nullable=False),
+    sa.Column('total_stock', sa.Integer(), nullable=False),
+    sa.Column('new_count', sa.Integer(), nullable=False),
+    sa.Column('used_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], name=op.f('fk_store_inventory_stats_store_id_stores'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('store_id')
+    )
+    op.execute(
+        "INSERT INTO game_offer_stats "
+        "(game_id, listing_count, min_price, avg_price, max_price, total_stock, new_count, used_count) "
+        "SELECT game_id, count(id), min(price), avg(price), max(price), coalesce(sum(stock), 0), "
+        "sum(CASE WHEN condition = 'New' THEN 1 ELSE 0 END), sum(CASE WHEN condition = 'Used' THEN 1 ELSE 0 END) "
+        "FROM listings WHERE game_id IS NOT NULL GROUP BY game_id"
+    )
+    op.execute(
+        "INSERT INTO store_inventory_stats "
+        "(store_id, listing_count, game_count, total_stock, new_count, used_count) "
+        "SELECT store_id, count(id), count(DISTINCT game_id), coalesce(sum(stock), 0), "
+        "sum(CASE WHEN condition = 'New' THEN 1 ELSE 0 END), sum(CASE WHEN condition = 'Used' THEN 1 ELSE 0 END) "
+        "FROM listings WHERE store_id IS NOT NULL GROUP BY store_id"
+    )
+
+
+def downgrade():
+    op.drop_table('store_inventory_stats')
+    op.drop_table('game_offer_stats')
@@ -0,0 +1,37 @@
+"""listing price history
+
+Revision ID: e6b4c1f9a273
+Revises: d9f3a6b2e815
+Create Date: 2026-10-18 23:41:17.649025
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b4c1f9a273'
+down_revision = 'd9f3a6b2e815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('listing_price_history',
+    sa.Column('listing_id', sa.Integer(), nullable=False),
+    sa.Column('ts', sa.DateTime(), nullable=False),
+    sa.Column('price', sa.Float(), nullable=True),
+    sa.Column('stock', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], name=op.f('fk_listing_price_history_listing_id_listings'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('listing_id', 'ts'),
+    sqlite_with_rowid=False
+    )
+    # Every listing starts with its current price and stock, as of its last write
+    op.execute(
+        "INSERT INTO listing_price_history (listing_id, ts, price, stock) "
+        "SELECT id, coalesce(updated_at, created_at), price, stock FROM listings"
+    )
+
+
+def downgrade():
+    op.drop_table('listing_price_history')
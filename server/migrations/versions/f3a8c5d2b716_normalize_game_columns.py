@@ -0,0 +1,181 @@
+"""normalize game columns
+
+Revision ID: f3a8c5d2b716
+Revises: e2f9b7c31a48
+Create Date: 2026-10-18 19:41:12.530847
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c5d2b716'
+down_revision = 'e2f9b7c31a48'
+branch_labels = None
+depends_on = None
+
+# Copies of the models' tuples; codes and console ids are 1-based positions
+RATINGS = ("E", "T", "M")
+CONDITIONS = ("New", "Used")
+CONSOLES = ("PlayStation", "Xbox", "PC", "Nintendo Switch")
+
+GAME_DOCUMENT = "coalesce(title, '') || ' ' || coalesce(genre, '') || ' ' || coalesce(console, '')"
+STORE_DOCUMENT = "coalesce(name, '') || ' ' || coalesce(location, '')"
+
+# Copy of search.GAME_DOCUMENTS
+GAME_DOCUMENTS = (
+    "SELECT 'game', games.id, games.title, "
+    "trim(coalesce(genres.name, '') || ' ' || coalesce({consoles}, '')) "
+    "FROM games LEFT JOIN genres ON genres.id = games.genre_id "
+    "LEFT JOIN game_consoles ON game_consoles.game_id = games.id "
+    "LEFT JOIN consoles ON consoles.id = game_consoles.console_id "
+    "GROUP BY games.id, games.title, genres.name"
+)
+
+
+def encode(expression, values):
+    whens = " ".join(f"WHEN '{value}' THEN {code}" for code, value in enumerate(values, 1))
+    return f"CASE {expression} {whens} END"
+
+
+def decode(expression, values):
+    whens = " ".join(f"WHEN {code} THEN '{value}'" for code, value in enumerate(values, 1))
+    return f"CASE {expression} {whens} END"
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+
+    consoles = op.create_table('consoles',
+    sa.Column('id', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(consoles, [{'id': id, 'name': name} for id, name in enumerate(CONSOLES, 1)])
+    op.create_table('genres',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index('ix_genres_name_lower', 'genres', [sa.text('lower(name)')], unique=False)
+    op.create_table('game_consoles',
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('console_id', sa.SmallInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['console_id'], ['consoles.id'], name=op.f('fk_game_consoles_console_id_consoles')),
+    sa.ForeignKeyConstraint(['game_id'], ['games.id'], name=op.f('fk_game_consoles_game_id_games')),
+    sa.PrimaryKeyConstraint('game_id', 'console_id')
+    )
+    op.create_index('ix_game_consoles_console_id_game_id', 'game_consoles', ['console_id', 'game_id'], unique=False)
+
+    op.execute("INSERT INTO genres (name) SELECT DISTINCT genre FROM games WHERE genre IS NOT NULL")
+    op.execute(
+        "INSERT INTO game_consoles (game_id, console_id) "
+        "SELECT games.id, consoles.id FROM games JOIN consoles ON lower(consoles.name) = lower(games.console)"
+    )
+
+    op.drop_index('ix_games_rating', table_name='games')
+    op.drop_index('ix_games_genre', table_name='games')
+    op.drop_index('ix_games_console', table_name='games')
+    if postgres:
+        op.drop_index('ix_stores_search', table_name='stores')
+        op.drop_index('ix_games_search', table_name='games')
+
+    with op.batch_alter_table('games', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('genre_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('rating_code', sa.SmallInteger(), nullable=True))
+    op.execute("UPDATE games SET genre_id = (SELECT id FROM genres WHERE genres.name = games.genre)")
+    op.execute(f"UPDATE games SET rating_code = {encode('upper(rating)', RATINGS)}")
+
+    with op.batch_alter_table('games', schema=None) as batch_op:
+        batch_op.drop_column('console')
+        batch_op.drop_column('genre')
+        batch_op.drop_column('rating')
+        batch_op.alter_column('rating_code', new_column_name='rating')
+        batch_op.create_foreign_key(batch_op.f('fk_games_genre_id_genres'), 'genres', ['genre_id'], ['id'])
+    op.create_index('ix_games_genre_id', 'games', ['genre_id'], unique=False)
+    op.create_index('ix_games_rating', 'games', ['rating'], unique=False)
+
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('condition_code', sa.SmallInteger(), nullable=True))
+    op.execute(f"UPDATE listings SET condition_code = {encode('condition', CONDITIONS)}")
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.drop_column('condition')
+        batch_op.alter_column('condition_code', new_column_name='condition')
+
+    if postgres:
+        # Game documents now span three tables, so search moves from
+        # expression indexes to a search_index table like SQLite's FTS5 one
+        op.execute(
+            "CREATE TABLE search_index ("
+            "  kind VARCHAR NOT NULL, ref_id INTEGER NOT NULL, title VARCHAR, body VARCHAR,"
+            "  document tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(body, ''))) STORED"
+            ")"
+        )
+        op.execute("CREATE INDEX ix_search_index_document ON search_index USING gin (document)")
+        op.execute("CREATE INDEX ix_search_index_kind_ref_id ON search_index (kind, ref_id)")
+        op.execute(
+            "INSERT INTO search_index (kind, ref_id, title, body) "
+            "SELECT 'store', id, name, location FROM stores"
+        )
+    else:
+        # Console names are canonical now and unknown consoles are gone, so
+        # the game documents are rebuilt from the new tables
+        op.execute("DELETE FROM search_index WHERE kind = 'game'")
+    console_names = "string_agg(consoles.name, ' ')" if postgres else "group_concat(consoles.name, ' ')"
+    op.execute("INSERT INTO search_index (kind, ref_id, title, body) " + GAME_DOCUMENTS.format(consoles=console_names))
+
+
+def downgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    if postgres:
+        op.execute("DROP TABLE search_index")
+
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('condition_name', sa.VARCHAR(), nullable=True))
+    op.execute(f"UPDATE listings SET condition_name = {decode('condition', CONDITIONS)}")
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.drop_column('condition')
+        batch_op.alter_column('condition_name', new_column_name='condition')
+
+    with op.batch_alter_table('games', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('console', sa.VARCHAR(), nullable=True))
+        batch_op.add_column(sa.Column('genre', sa.VARCHAR(), nullable=True))
+        batch_op.add_column(sa.Column('rating_name', sa.VARCHAR(), nullable=True))
+    # A game on several consoles keeps the first one
+    op.execute(
+        "UPDATE games SET console = (SELECT consoles.name FROM game_consoles "
+        "JOIN consoles ON consoles.id = game_consoles.console_id "
+        "WHERE game_consoles.game_id = games.id ORDER BY consoles.id LIMIT 1)"
+    )
+    op.execute("UPDATE games SET genre = (SELECT name FROM genres WHERE genres.id = games.genre_id)")
+    op.execute(f"UPDATE games SET rating_name = {decode('rating', RATINGS)}")
+    if not postgres:
+        op.execute("DELETE FROM search_index WHERE kind = 'game'")
+        op.execute(
+            "INSERT INTO search_index (kind, ref_id, title, body) "
+            "SELECT 'game', id, title, trim(coalesce(genre, '') || ' ' || coalesce(console, '')) FROM games"
+        )
+
+    op.drop_index('ix_games_rating', table_name='games')
+    op.drop_index('ix_games_genre_id', table_name='games')
+    with op.batch_alter_table('games', schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f('fk_games_genre_id_genres'), type_='foreignkey')
+        batch_op.drop_column('genre_id')
+        batch_op.drop_column('rating')
+        batch_op.alter_column('rating_name', new_column_name='rating')
+
+    op.create_index('ix_games_console', 'games', [sa.text('lower(console)')], unique=False)
+    op.create_index('ix_games_genre', 'games', [sa.text('lower(genre)')], unique=False)
+    op.create_index('ix_games_rating', 'games', [sa.text('lower(rating)')], unique=False)
+    if postgres:
+        op.execute(f"CREATE INDEX ix_games_search ON games USING gin (to_tsvector('simple', {GAME_DOCUMENT}))")
+        op.execute(f"CREATE INDEX ix_stores_search ON stores USING gin (to_tsvector('simple', {STORE_DOCUMENT}))")
+
+    op.drop_index('ix_game_consoles_console_id_game_id', table_name='game_consoles')
+    op.drop_table('game_consoles')
+    op.drop_index('ix_genres_name_lower', table_name='genres')
+    op.drop_table('genres')
+    op.drop_table('consoles')
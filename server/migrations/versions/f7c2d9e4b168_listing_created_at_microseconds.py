@@ -0,0 +1,27 @@
+"""listing created_at microseconds
+
+Revision ID: f7c2d9e4b168
+Revises: e6b4c1f9a273
+Create Date: 2026-10-19 10:12:53.318204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c2d9e4b168'
+down_revision = 'e6b4c1f9a273'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # created_at used to default to CURRENT_TIMESTAMP, which SQLite stores
+    # without microseconds. Keyset cursors compare against the stored text,
+    # so bring those rows to the format SQLAlchemy writes.
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("UPDATE listings SET created_at = created_at || '.000000' WHERE length(created_at) = 19")
+
+
+def downgrade():
+    pass
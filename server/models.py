@@ -1,26 +1,161 @@
 from sqlalchemy_serializer import SerializerMixin
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import validates
-from sqlalchemy import func
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+from functools import lru_cache
 from config import db
 
 
+# Stores share a handful of opening-hours strings, so each is parsed once
+@lru_cache(maxsize=1024)
+def parse_hours(hours):
+    # Normalize input by removing any spaces
+    hours = hours.replace(" ", "")
+    # Ensure the hours string is in the correct format
+    try:
+        # Split the hours string by "-"
+        start_time, end_time = hours.split("-")
+        # Extract the hour part (before the ":")
+        start_hour = int(start_time.split(":")[0])
+        end_hour = int(end_time.split(":")[0])
+        # Check if both start and end hours are valid
+        if not (0 <= start_hour <= 23 and 0 <= end_hour <= 23):
+            raise ValueError('Hours must be between 0 and 23.')
+    except (ValueError, IndexError):
+        raise ValueError('Hours must be in the format "X:00 - Y:00" with valid hours between 0 and 23.')
+    return hours
+
+
+@lru_cache(maxsize=1024)
+def opening_minutes(hours):
+    # (opens, closes) in minutes after midnight for a parse_hours string
+    times = [time.split(":") for time in hours.split("-")]
+    return tuple(int(t[0]) * 60 + (min(int(t[1]), 59) if len(t) > 1 and t[1].isdigit() else 0) for t in times)
+
+
+RATINGS = ("E", "T", "M")
+CONDITIONS = ("New", "Used")
+# consoles.id is the position in this tuple (1-based)
+CONSOLES = ("PlayStation", "Xbox", "PC", "Nintendo Switch")
+CONSOLE_IDS = {name.lower(): id for id, name in enumerate(CONSOLES, 1)}
+
+
+class Code(db.TypeDecorator):
+    # One of a fixed set of strings, stored as its 1-based position in a
+    # SMALLINT. Comparisons in queries encode the string the same way.
+    impl = db.SmallInteger
+    cache_ok = True
+
+    def __init__(self, values):
+        super().__init__()
+        self.values = tuple(values)
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else self.values.index(value) + 1
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.values[value - 1]
+
+
+class Console(db.Model):
+    __tablename__ = "consoles"
+
+    id = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    name = db.Column(db.String, nullable=False, unique=True)
+
+    def __repr__(self):
+        return f'<Console {self.id}: {self.name}>'
+
+
+@event.listens_for(Console.__table__, "after_create")
+def seed_consoles(table, connection, **kw):
+    connection.execute(table.insert(), [{"id": id, "name": name} for id, name in enumerate(CONSOLES, 1)])
+
+
+class GameConsole(db.Model):
+    __tablename__ = "game_consoles"
+
+    game_id = db.Column(db.Integer, db.ForeignKey("games.id"), primary_key=True)
+    console_id = db.Column(db.SmallInteger, db.ForeignKey("consoles.id"), primary_key=True)
+
+    # The primary key serves lookups by game; this one serves console filters
+    __table_args__ = (
+        db.Index("ix_game_consoles_console_id_game_id", "console_id", "game_id"),
+    )
+
+
+class Genre(db.Model):
+    __tablename__ = "genres"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False, unique=True)
+
+    # The genre filter is case-insensitive
+    __table_args__ = (
+        db.Index("ix_genres_name_lower", func.lower(name)),
+    )
+
+    def __repr__(self):
+        return f'<Genre {self.id}: {self.name}>'
+
+
 class Game(db.Model, SerializerMixin):
     __tablename__ = "games"
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String, nullable=False, unique=True)
-    rating = db.Column(db.String)
+    rating = db.Column(Code(RATINGS))
 
-    console = db.Column(db.String)
-    genre = db.Column(db.String)
+    genre_id = db.Column(db.Integer, db.ForeignKey("genres.id"))
     image = db.Column(db.String)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # passive_deletes: deleting a game doesn't load its listings, see child_deletes
+    listings = db.relationship("Listing", back_populates="game", cascade="all, delete-orphan", passive_deletes=True)
+    # Loaded with every game; console and genre are read from these
+    genre_ref = db.relationship("Genre", lazy="joined")
+    console_links = db.relationship(
+        "GameConsole", lazy="selectin", cascade="all, delete-orphan", order_by=GameConsole.console_id,
+    )
+
+    # Filters compare integer codes and ids (console through game_consoles)
+    __table_args__ = (
+        db.Index("ix_games_genre_id", "genre_id"),
+        db.Index("ix_games_rating", "rating"),
+    )
+
 
+    serialize_rules = ("-listings.game", "-genre_id", "-genre_ref", "-console_links", "console", "genre")
 
-    listings = db.relationship("Listing", back_populates="game", cascade="all, delete-orphan")
 
+    @property
+    def console(self):
+        # A single console reads back as a string, as it always has; a game
+        # on several consoles returns the list
+        names = self.console_names
+        if not names:
+            return None
+        return names[0] if len(names) == 1 else names
 
-    serialize_rules = ("-listings.game",)
+    @console.setter
+    def console(self, console):
+        names = self.validates_console("console", console)
+        self.console_links = [GameConsole(console_id=CONSOLE_IDS[name.lower()]) for name in names]
+
+    @property
+    def console_names(self):
+        return [CONSOLES[link.console_id - 1] for link in self.console_links]
+
+    @property
+    def genre(self):
+        return self.genre_ref.name if self.genre_ref else None
+
+    @genre.setter
+    def genre(self, genre):
+        # Matched to an existing genre row by name at flush (reuse_genres)
+        self.genre_ref = Genre(name=self.validates_genre("genre", genre))
 
 
     @validates("title")
@@ -33,30 +168,28 @@ class Game(db.Model, SerializerMixin):
 
     @validates("rating")
     def validates_rating(self, key, rating):
-        if rating.upper() in ("E", "T", "M"):
-            return rating
+        if rating.upper() in RATINGS:
+            return rating.upper()
         else:
             raise ValueError("Rating must be either E, T, or M")
 
 
-    @validates("console")
     def validates_console(self, key, console):
-        valid_consoles = {"playstation", "xbox", "pc", "nintendo switch"} 
+        # Returns the canonical console names
         if isinstance(console, str):
-            if console.lower() in valid_consoles:
-                return console
+            if console.lower() in CONSOLE_IDS:
+                return [CONSOLES[CONSOLE_IDS[console.lower()] - 1]]
             else:
                 raise ValueError("Console must be PlayStation, Xbox, PC, or Nintendo Switch")
         elif isinstance(console, (list, set)):
-            if all(c.lower() in valid_consoles for c in console):
-                return console
+            if console and all(isinstance(c, str) and c.lower() in CONSOLE_IDS for c in console):
+                return sorted({CONSOLES[CONSOLE_IDS[c.lower()] - 1] for c in console}, key=CONSOLES.index)
             else:
                 raise ValueError("Each console must be one of PlayStation, Xbox, PC, or Nintendo Switch")
         else:
             raise ValueError("Console must be a string or a list of valid console names")
 
 
-    @validates("genre")
     def validates_genre(self, key, genre):
         if isinstance(genre, str) and 1 < len(genre) < 25:
             return genre
@@ -81,11 +214,23 @@ class Store(db.Model, SerializerMixin):
     name = db.Column(db.String, nullable=False, unique=True)
     location = db.Column(db.String, nullable=False)
     hours = db.Column(db.String)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Derived for /stores/nearby: hours as minutes after midnight, and the
+    # geohash of the coordinates (set by geo.py)
+    opens_at = db.Column(db.SmallInteger)
+    closes_at = db.Column(db.SmallInteger)
+    geohash = db.Column(db.String)
 
+    listings = db.relationship("Listing", back_populates="store", cascade="all, delete-orphan", passive_deletes=True)
 
-    listings = db.relationship("Listing", back_populates="store", cascade="all, delete-orphan")
+    __table_args__ = (
+        db.Index("ix_stores_geohash", "geohash"),
+    )
 
-    serialize_rules = ("-listings.store",)
+    serialize_rules = ("-listings.store", "-opens_at", "-closes_at", "-geohash")
 
     
     @validates("name")
@@ -108,22 +253,19 @@ class Store(db.Model, SerializerMixin):
     
     @validates("hours")
     def validates_hours(self, key, hours):
-        # Normalize input by removing any spaces
-        hours = hours.replace(" ", "")
-        # Ensure the hours string is in the correct format
-        try:
-            # Split the hours string by "-"
-            start_time, end_time = hours.split("-")
-            # Extract the hour part (before the ":")
-            start_hour = int(start_time.split(":")[0])
-            end_hour = int(end_time.split(":")[0])
-            # Check if both start and end hours are valid
-            if not (0 <= start_hour <= 23 and 0 <= end_hour <= 23):
-                raise ValueError('Hours must be between 0 and 23.')
-        except (ValueError, IndexError):
-            raise ValueError('Hours must be in the format "X:00 - Y:00" with valid hours between 0 and 23.')
+        hours = parse_hours(hours)
+        self.opens_at, self.closes_at = opening_minutes(hours)
         return hours
 
+    @validates("latitude", "longitude")
+    def validates_coordinates(self, key, value):
+        limit = 90 if key == "latitude" else 180
+        if value is None:
+            return None
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and -limit <= value <= limit:
+            return float(value)
+        raise ValueError(f"{key.capitalize()} must be a number between -{limit} and {limit}.")
+
 
     def __repr__(self):
         return f'<Store {self.id}: {self.name}>'
@@ -135,9 +277,15 @@ class Listing(db.Model, SerializerMixin):
     id = db.Column(db.Integer, primary_key=True)
     price = db.Column(db.Float)
     stock = db.Column(db.Integer, nullable=False)
-    condition = db.Column(db.String)
+    condition = db.Column(Code(CONDITIONS))
 
-    created_at = db.Column(db.DateTime, default=func.now(), nullable=False)
+    # Set in Python so SQLite stores microseconds like every other datetime;
+    # the keyset cursor compares against the stored text
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Optimistic locking: every UPDATE checks and bumps it, so a write based
+    # on a stale read fails with StaleDataError instead of overwriting
+    version = db.Column(db.Integer, nullable=False, default=1)
 
     game_id = db.Column(db.Integer, db.ForeignKey("games.id"))
     store_id = db.Column(db.Integer, db.ForeignKey("stores.id"))
@@ -146,6 +294,15 @@ class Listing(db.Model, SerializerMixin):
     game = db.relationship("Game", back_populates="listings")
     store = db.relationship("Store", back_populates="listings")
 
+    # game_id/store_id lead so per-game and per-store lookups (and cascades)
+    # use an index, with created_at for keyset pagination within them
+    __table_args__ = (
+        db.Index("ix_listings_created_at_id", "created_at", "id"),
+        db.Index("ix_listings_game_id_created_at", "game_id", "created_at"),
+        db.Index("ix_listings_store_id_created_at", "store_id", "created_at"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
     
     serialize_rules = ("-game.listings", "-store.listings")
 
@@ -168,7 +325,7 @@ class Listing(db.Model, SerializerMixin):
     def validates_condition(self, key, condition):
         condition = condition.strip().title()
 
-        if condition in ("New", "Used"):
+        if condition in CONDITIONS:
             return condition
         else:
             raise ValueError("Condition must be either 'New' or 'Used'.")
@@ -176,16 +333,160 @@ class Listing(db.Model, SerializerMixin):
     @validates("game_id", "store_id")
     def validates_foreign_key(self, key, id):
         if key == "game_id":
-            if isinstance(id, int) and id > 0:
+            if isinstance(id, int) and not isinstance(id, bool) and id > 0:
                 return id
             else:
                 raise ValueError("game_id must be a positive integer")
         if key == "store_id":
-            if isinstance(id, int) and id > 0:
+            if isinstance(id, int) and not isinstance(id, bool) and id > 0:
                 return id
             else:
                 raise ValueError("store_id must be a positive integer")
         raise ValueError(f"{key} is invalid")
 
     def __repr__(self):
-        return f'<Listing {self.id}>'
\ No newline at end of file
+        return f'<Listing {self.id}>'
+
+
+def child_deletes(parent):
+    # One DELETE for all the listings of a game or store, to run before
+    # deleting it. As ORM statements they still go through the session
+    # listeners (change log, cache, table versions, summaries), which a
+    # database-level ON DELETE CASCADE would bypass.
+    column = Listing.game_id if isinstance(parent, Game) else Listing.store_id
+    return [delete(Listing).where(column == parent.id).execution_options(synchronize_session=False)]
+
+
+# Dialect inserts with ON CONFLICT clauses
+INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+@event.listens_for(db.session, "before_flush")
+def reuse_genres(session, flush_context, instances):
+    # Game.genre assigns a new Genre by name; point the games at the stored
+    # row instead, so genres stay one row per name. A missing name is
+    # inserted with ON CONFLICT DO NOTHING, so two writers adding the same
+    # new genre both end up on the row that won.
+    pending = [obj for obj in session.new if isinstance(obj, Genre)]
+    if not pending:
+        return
+    with session.no_autoflush:
+        names = {genre.name for genre in pending}
+        stored = select(Genre).where(Genre.name.in_(names))
+        genres = {genre.name: genre for genre in session.scalars(stored)}
+        missing = names - set(genres)
+        if missing:
+            connection = session.connection()
+            insert = INSERTS[connection.dialect.name](Genre).values([{"name": name} for name in sorted(missing)])
+            connection.execute(insert.on_conflict_do_nothing(index_elements=["name"]))
+            genres.update((genre.name, genre) for genre in session.scalars(stored.where(Genre.name.in_(missing))))
+        for game in list(session.new) + list(session.dirty):
+            if isinstance(game, Game) and game.genre_ref in pending:
+                game.genre_ref = genres[game.genre_ref.name]
+        for genre in pending:
+            session.expunge(genre)
+
+
+class TableVersion(db.Model):
+    __tablename__ = "table_versions"
+
+    # One row per catalog table, bumped whenever any of its rows change
+    table_name = db.Column(db.String, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<TableVersion {self.table_name}: {self.version}>'
+
+
+CHANGE_OPS = ("insert", "update", "delete")
+
+
+class Change(db.Model):
+    __tablename__ = "changes"
+
+    # Append-only log of game, store and listing writes, see changes.py.
+    # AUTOINCREMENT so SQLite never reuses the seq of a compacted entry.
+    seq = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String, nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(Code(CHANGE_OPS), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_changes_table_name_row_id", "table_name", "row_id"),
+        {"sqlite_autoincrement": True},
+    )
+
+    def __repr__(self):
+        return f'<Change {self.seq}: {self.op} {self.table_name} {self.row_id}>'
+
+
+class GameOfferStats(db.Model):
+    __tablename__ = "game_offer_stats"
+
+    # Materialized per-game listing aggregates, see inventory.py
+    game_id = db.Column(db.Integer, db.ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
+    listing_count = db.Column(db.Integer, nullable=False, default=0)
+    min_price = db.Column(db.Float)
+    avg_price = db.Column(db.Float)
+    max_price = db.Column(db.Float)
+    total_stock = db.Column(db.Integer, nullable=False, default=0)
+    new_count = db.Column(db.Integer, nullable=False, default=0)
+    used_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<GameOfferStats {self.game_id}>'
+
+
+class StoreInventoryStats(db.Model):
+    __tablename__ = "store_inventory_stats"
+
+    # Materialized per-store listing aggregates, see inventory.py
+    store_id = db.Column(db.Integer, db.ForeignKey("stores.id", ondelete="CASCADE"), primary_key=True)
+    listing_count = db.Column(db.Integer, nullable=False, default=0)
+    game_count = db.Column(db.Integer, nullable=False, default=0)
+    total_stock = db.Column(db.Integer, nullable=False, default=0)
+    new_count = db.Column(db.Integer, nullable=False, default=0)
+    used_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StoreInventoryStats {self.store_id}>'
+
+
+class PriceHistory(db.Model):
+    __tablename__ = "listing_price_history"
+
+    # Append-only price/stock points per listing, see history.py. The
+    # (listing_id, ts) key covers every history query; on SQLite the table
+    # is stored as that index (WITHOUT ROWID), so there is no second lookup.
+    listing_id = db.Column(db.Integer, db.ForeignKey("listings.id", ondelete="CASCADE"), primary_key=True)
+    ts = db.Column(db.DateTime, primary_key=True)
+    price = db.Column(db.Float)
+    stock = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = ({"sqlite_with_rowid": False},)
+
+    def __repr__(self):
+        return f'<PriceHistory {self.listing_id} {self.ts}>'
+
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+class Job(db.Model):
+    __tablename__ = "jobs"
+
+    # Background work run by the worker pool in jobs.py. Kept in the
+    # database so any worker process can report on it.
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    status = db.Column(Code(JOB_STATUSES), nullable=False, default="queued")
+    result = db.Column(db.JSON)
+    error = db.Column(db.String)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id}: {self.name} {self.status}>'
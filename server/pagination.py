@@ -0,0 +1,101 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, Numeric, String, and_, or_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def encode_cursor(values):
+    # Datetimes are not JSON serializable, so keep them as ISO strings
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token, columns):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Invalid cursor.")
+
+    return [decode_value(column, value) for column, value in zip(columns, values)]
+
+
+def decode_value(column, value):
+    # Each value must match its column's type; anything else would be
+    # compared as text or fail in the database
+    if isinstance(column.type, DateTime):
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor.")
+    if isinstance(value, bool):
+        raise ValueError("Invalid cursor.")
+    if isinstance(column.type, Integer) and isinstance(value, int):
+        return value
+    if isinstance(column.type, Numeric) and isinstance(value, (int, float)):
+        return value
+    if isinstance(column.type, String) and isinstance(value, str):
+        return value
+    raise ValueError("Invalid cursor.")
+
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer.")
+    if limit < 1:
+        raise ValueError("limit must be a positive integer.")
+    return min(limit, MAX_LIMIT)
+
+
+def parse_offset(value):
+    if value is None or value == "":
+        return 0
+    try:
+        offset = int(value)
+    except ValueError:
+        raise ValueError("offset must be an integer.")
+    if offset < 0:
+        raise ValueError("offset must not be negative.")
+    return offset
+
+
+def keyset_filter(columns, values):
+    # (a, b) > (x, y)  ==>  a > x OR (a = x AND b > y)
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, column > values[i]))
+    return or_(*clauses)
+
+
+def page_query(query, columns, limit, cursor=None):
+    # Works on a Query or a select(); the async app executes it itself
+    if cursor:
+        query = query.filter(keyset_filter(columns, decode_cursor(cursor, columns)))
+
+    # Fetch one extra row to know whether another page exists
+    return query.order_by(*columns).limit(limit + 1)
+
+
+def split_page(rows, columns, limit):
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, column.key) for column in columns])
+
+
+def paginate(query, columns, limit, cursor=None):
+    return split_page(page_query(query, columns, limit, cursor).all(), columns, limit)
@@ -0,0 +1,88 @@
+from sqlalchemy import false, func, select
+
+from models import Game, Listing, GameConsole, Genre, CONDITIONS, CONSOLE_IDS, RATINGS
+
+# Request parsing shared by the Flask resources and the ASGI app. args is
+# any mapping of query string values (request.args or a parsed query string)
+
+GAME_FIELDS = ("title", "rating", "console", "genre", "image")
+STORE_FIELDS = ("name", "location", "hours", "latitude", "longitude")
+LISTING_FIELDS = ("condition", "stock", "price", "game_id", "store_id")
+
+
+def apply_changes(obj, json, fields):
+    # Partial update: only fields present in the body and different from the
+    # current value are set, so untouched columns skip their validators and
+    # the UPDATE
+    if not isinstance(json, dict):
+        raise ValueError("Request body must be a JSON object.")
+    changed = False
+    for field in fields:
+        if field in json and json[field] != getattr(obj, field):
+            setattr(obj, field, json[field])
+            changed = True
+    return changed
+
+
+def query_number(args, name, cast=int):
+    value = args.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number.")
+
+
+def query_flag(args, name):
+    value = args.get(name)
+    if value is None or value == "":
+        return None
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"{name} must be true or false.")
+
+
+def filter_games(query, args):
+    # Integer lookups: console through game_consoles, genre through the genres
+    # table, rating on its code. Unknown values match nothing.
+    console, genre, rating = args.get("console"), args.get("genre"), args.get("rating")
+    if console:
+        console_id = CONSOLE_IDS.get(console.lower())
+        query = query.filter(
+            Game.id.in_(select(GameConsole.game_id).where(GameConsole.console_id == console_id))
+            if console_id else false()
+        )
+    if genre:
+        query = query.filter(Game.genre_id.in_(select(Genre.id).where(func.lower(Genre.name) == genre.lower())))
+    if rating:
+        query = query.filter(Game.rating == rating.upper() if rating.upper() in RATINGS else false())
+    return query
+
+
+def filter_listings(query, args):
+    game_id = query_number(args, "game_id")
+    store_id = query_number(args, "store_id")
+    min_price = query_number(args, "min_price", float)
+    max_price = query_number(args, "max_price", float)
+    in_stock = query_flag(args, "in_stock")
+    condition = args.get("condition")
+
+    if game_id is not None:
+        query = query.filter(Listing.game_id == game_id)
+    if store_id is not None:
+        query = query.filter(Listing.store_id == store_id)
+    if condition:
+        condition = condition.strip().title()
+        query = query.filter(Listing.condition == condition if condition in CONDITIONS else false())
+    if min_price is not None:
+        query = query.filter(Listing.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Listing.price <= max_price)
+    if in_stock is True:
+        query = query.filter(Listing.stock > 0)
+    elif in_stock is False:
+        query = query.filter(Listing.stock == 0)
+    return query
@@ -0,0 +1,156 @@
+import re
+
+from sqlalchemy import event, text
+
+from config import db
+from models import Game, Store
+
+# One search_index table of (kind, ref_id, title, body) documents, kept in
+# sync from after_flush. SQLite: an FTS5 virtual table whose rowid is
+# ref_id * 2 + the kind's code, so a document is replaced or removed by
+# rowid instead of scanning the UNINDEXED kind and ref_id columns.
+# Postgres: a plain table with a generated tsvector column under a GIN
+# index and a (kind, ref_id) index.
+CREATE_FTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index "
+    "USING fts5(kind UNINDEXED, ref_id UNINDEXED, title, body, tokenize='unicode61')"
+)
+
+CREATE_POSTGRES_INDEX = (
+    "CREATE TABLE IF NOT EXISTS search_index ("
+    "  kind VARCHAR NOT NULL, ref_id INTEGER NOT NULL, title VARCHAR, body VARCHAR,"
+    "  document tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(body, ''))) STORED"
+    ")",
+    "CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING gin (document)",
+    "CREATE INDEX IF NOT EXISTS ix_search_index_kind_ref_id ON search_index (kind, ref_id)",
+)
+
+SQLITE_SEARCH = text(
+    "SELECT kind, ref_id, -rank AS score FROM search_index "
+    "WHERE search_index MATCH :query AND (:kind IS NULL OR kind = :kind) "
+    "ORDER BY rank LIMIT :limit OFFSET :offset"
+)
+
+POSTGRES_SEARCH = text(
+    "SELECT kind, ref_id, ts_rank(document, q) AS score "
+    "FROM search_index, to_tsquery('simple', :query) q "
+    "WHERE document @@ q AND (CAST(:kind AS TEXT) IS NULL OR kind = :kind) "
+    "ORDER BY score DESC, kind, ref_id LIMIT :limit OFFSET :offset"
+)
+
+# Game documents: genre and console names come from the lookup tables
+GAME_DOCUMENTS = (
+    "SELECT {rowid}'game', games.id, games.title, "
+    "trim(coalesce(genres.name, '') || ' ' || coalesce({consoles}, '')) "
+    "FROM games LEFT JOIN genres ON genres.id = games.genre_id "
+    "LEFT JOIN game_consoles ON game_consoles.game_id = games.id "
+    "LEFT JOIN consoles ON consoles.id = game_consoles.console_id "
+    "GROUP BY games.id, games.title, genres.name"
+)
+
+INDEXED_MODELS = {Game: "game", Store: "store"}
+KIND_CODES = {"game": 0, "store": 1}
+
+
+def is_sqlite(bind):
+    return bind.dialect.name == "sqlite"
+
+
+def search_terms(q):
+    terms = re.findall(r"\w+", q or "")
+    if not terms:
+        raise ValueError("q must contain at least one word.")
+    return terms
+
+
+def document_rowid(kind, id):
+    return id * 2 + KIND_CODES[kind]
+
+
+def document(obj):
+    if isinstance(obj, Game):
+        return obj.title, " ".join(filter(None, (obj.genre, *obj.console_names)))
+    return obj.name, obj.location
+
+
+def remove_documents(connection, kind, ids):
+    if is_sqlite(connection):
+        connection.execute(
+            text("DELETE FROM search_index WHERE rowid = :rowid"),
+            [{"rowid": document_rowid(kind, id)} for id in ids],
+        )
+        return
+    connection.execute(
+        text("DELETE FROM search_index WHERE kind = :kind AND ref_id = :ref_id"),
+        [{"kind": kind, "ref_id": id} for id in ids],
+    )
+
+
+def add_documents(connection, kind, objects):
+    rows = []
+    for obj in objects:
+        title, body = document(obj)
+        rows.append({"rowid": document_rowid(kind, obj.id), "kind": kind, "ref_id": obj.id, "title": title, "body": body})
+    if is_sqlite(connection):
+        statement = "INSERT INTO search_index (rowid, kind, ref_id, title, body) VALUES (:rowid, :kind, :ref_id, :title, :body)"
+    else:
+        statement = "INSERT INTO search_index (kind, ref_id, title, body) VALUES (:kind, :ref_id, :title, :body)"
+    connection.execute(text(statement), rows)
+
+
+def create_index_table(connection):
+    for statement in (CREATE_FTS,) if is_sqlite(connection) else CREATE_POSTGRES_INDEX:
+        connection.execute(text(statement))
+
+
+@event.listens_for(db.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    create_index_table(connection)
+
+
+@event.listens_for(db.metadata, "before_drop")
+def drop_search_index(target, connection, **kw):
+    connection.execute(text("DROP TABLE IF EXISTS search_index"))
+
+
+@event.listens_for(db.session, "after_flush")
+def sync_search_index(session, flush_context):
+    connection = session.connection()
+    for model, kind in INDEXED_MODELS.items():
+        changed = [obj for obj in session.dirty if isinstance(obj, model) and session.is_modified(obj)]
+        removed = [obj for obj in session.deleted if isinstance(obj, model)] + changed
+        added = [obj for obj in session.new if isinstance(obj, model)] + changed
+        if removed:
+            remove_documents(connection, kind, [obj.id for obj in removed])
+        if added:
+            add_documents(connection, kind, added)
+
+
+def rebuild_search_index(connection):
+    # For rows written outside the ORM (bulk seeding, imports)
+    create_index_table(connection)
+    if is_sqlite(connection):
+        consoles, columns = "group_concat(consoles.name, ' ')", "rowid, kind, ref_id, title, body"
+        game_rowid, store_rowid = f"games.id * 2 + {KIND_CODES['game']}, ", f"id * 2 + {KIND_CODES['store']}, "
+    else:
+        consoles, columns = "string_agg(consoles.name, ' ')", "kind, ref_id, title, body"
+        game_rowid = store_rowid = ""
+    connection.execute(text("DELETE FROM search_index"))
+    connection.execute(text(
+        f"INSERT INTO search_index ({columns}) " + GAME_DOCUMENTS.format(rowid=game_rowid, consoles=consoles)
+    ))
+    connection.execute(text(
+        f"INSERT INTO search_index ({columns}) SELECT {store_rowid}'store', id, name, location FROM stores"
+    ))
+
+
+def search(q, kind=None, limit=20, offset=0):
+    terms = search_terms(q)
+    connection = db.session.connection()
+    if is_sqlite(connection):
+        # Quote every term so user input can't inject FTS5 syntax; * matches prefixes
+        query, statement = " ".join(f'"{term}"*' for term in terms), SQLITE_SEARCH
+    else:
+        query, statement = " & ".join(f"{term}:*" for term in terms), POSTGRES_SEARCH
+    params = {"query": query, "kind": kind, "limit": limit, "offset": offset}
+    return db.session.execute(statement, params).all()
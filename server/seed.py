@@ -1,93 +1,213 @@
 #!/usr/bin/env python3
 
 # Standard library imports
-from random import randint, choice as rc
+import argparse
+import random
+import time
 from datetime import datetime, timedelta
 
 # Remote library imports
 from faker import Faker
+from sqlalchemy import DateTime, TypeDecorator, insert, select
 
 # Local imports
 from app import app
-from models import db, Game, Store, Listing
+from models import db, Game, GameConsole, Genre, Store, Listing, CONDITIONS, CONSOLES, RATINGS, opening_minutes
+from search import rebuild_search_index
+from geo import encode
+from inventory import refresh_summaries
+from history import record_points
+
+BATCH_SIZE = 10000
+
+predefined_games = [
+    {"title": "Mega Man", "image": "https://upload.wikimedia.org/wikipedia/en/b/bf/Mega_Man_X4_PSX.jpg"},
+    {"title": "Donkey Kong", "image": "https://encrypted-tbn3.gstatic.com/images?q=tbn:ANd9GcSuZ4WZ1W_-MfVFcVHuiXseEXJ5YeW5yQAdEb7BQ4thjhQRqp3FTDo4m8T7wXmodDkYDssk"},
+    {"title": "Rise of the Ronin", "image": "https://image.api.playstation.com/vulcan/ap/rnd/202212/2201/ZfPosZoz1CKZBHTIKUCQRy47.png"},
+    {"title": "Super Smash Bros.", "image": "https://assets.nintendo.com/image/upload/q_auto:best/f_auto/dpr_2.0/ncom/software/switch/70010000012332/ac4d1fc9824876ce756406f0525d50c57ded4b2a666f6dfe40a6ac5c3563fad9"},
+    {"title": "Kingdom Hearts", "image": "https://m.media-amazon.com/images/I/918AUL+i-DL.jpg"},
+    {"title": "Nioh II", "image": "https://image.api.playstation.com/vulcan/img/rnd/202011/0423/P7Sm4r3F8krCQcnN5uqwsS00.png"},
+    {"title": "Elden Ring", "image": "https://image.api.playstation.com/vulcan/ap/rnd/202110/2000/aGhopp3MHppi7kooGE2Dtt8C.png"},
+    {"title": "Dark Souls III", "image": "https://static.bandainamcoent.eu/high/dark-souls/dark-souls-3/00-page-setup/ds3_game-thumbnail.jpg"},
+    {"title": "Pokemon Fallen Thrones", "image": "https://i.imgur.com/VP0VH7E.png"},
+    {"title": "Ninja Gaiden", "image": "https://www.lilithia.net/wp-content/uploads/2021/06/ninjagaidencollection-1576x1182.jpg"},
+    {"title": "The Legend of Zelda: Breath of the Wild", "image": "https://encrypted-tbn3.gstatic.com/images?q=tbn:ANd9GcSO0-bXLKMPSHQECjZUuy4gbwdgmF-7sfhHQ0b59Q2nv8ZZiBzgHEu5mwDuVLBPf71rkB_zQA"},
+    {"title": "Grand Theft Auto V", "image": "https://upload.wikimedia.org/wikipedia/en/a/a5/Grand_Theft_Auto_V.png"},
+    {"title": "Cyberpunk", "image": "https://upload.wikimedia.org/wikipedia/en/9/9f/Cyberpunk_2077_box_art.jpg"},
+    {"title": "The Witcher III: Wild Hunt", "image": "https://upload.wikimedia.org/wikipedia/en/0/0c/Witcher_3_cover_art.jpg"}
+]
+
+predefined_stores = [
+    {"name": "GameStop", "location": "640 Camino Del Rio N STE 317A, San Diego, CA 92108", "coordinates": (32.7683, -117.1530)},
+    {"name": "EB Games", "location": "2612 S Shepherd Dr Houston, TX 77098", "coordinates": (29.7382, -95.4102)},
+    {"name": "Best Buy", "location": "3 Mill Creek Dr, Secaucus, NJ 07094", "coordinates": (40.7865, -74.0470)},
+    {"name": "Electronics Boutique", "location": "2589 Walter Green Cmns, Madison, OH 44057", "coordinates": (41.7714, -81.0498)},
+    {"name": "Gaming Odyssey", "location": "1400 Skyline Blvd, Bismarck, ND 58503", "coordinates": (46.8256, -100.8240)},
+]
+
+GENRES = ["Action", "Adventure", "RPG", "Strategy", "Shooter"]
+
+TITLE_WORDS = ["Dark", "Legend", "Kingdom", "Ninja", "Cyber", "Mega", "Quest", "Wild", "Shadow", "Star",
+               "Racing", "Tactics", "Fantasy", "Storm", "Iron", "Sky", "Ghost", "Dragon", "Souls", "Hunt"]
+
+
+def batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_rows(connection, model, rows):
+    # Compile the INSERT once and hand each batch straight to the DB-API
+    # executemany, skipping per-row ORM objects and bind processing except
+    # for coded columns (rating, condition).
+    # Rows must carry every column that has a Python-side default.
+    # Datetimes go through the dialect too, so SQLite stores them in the same
+    # format as the ORM (keyset cursors compare the stored text).
+    compiled = None
+    for batch in batches(rows):
+        if compiled is None:
+            compiled = insert(model.__table__).compile(dialect=connection.dialect, column_keys=list(batch[0]))
+            columns = model.__table__.c
+            coded = {key: columns[key].type.bind_processor(connection.dialect) for key in batch[0]
+                     if isinstance(columns[key].type, (TypeDecorator, DateTime))}
+            coded = {key: process for key, process in coded.items() if process}
+        for key, process in coded.items():
+            for row in batch:
+                row[key] = process(row[key])
+        if compiled.positional:
+            batch = [tuple(row[key] for key in compiled.positiontup) for row in batch]
+        connection.exec_driver_sql(compiled.string, batch)
+
+
+def game_rows(count, rng, genre_ids):
+    now = datetime.utcnow()
+    for i in range(count):
+        if i < len(predefined_games):
+            title, image = predefined_games[i]["title"], predefined_games[i]["image"]
+        else:
+            title = f"{' '.join(rng.sample(TITLE_WORDS, 3))} {i}"
+            image = f"https://picsum.photos/seed/{i}/300/400"
+        yield {
+            "title": title,
+            "rating": rng.choice(RATINGS),
+            "genre_id": rng.choice(genre_ids),
+            "image": image,
+            "updated_at": now,
+        }
+
+
+def console_rows(game_ids, rng):
+    # Most games are on one console, some on two
+    for game_id in game_ids:
+        for console_id in rng.sample(range(1, len(CONSOLES) + 1), 2 if rng.random() < 0.2 else 1):
+            yield {"game_id": game_id, "console_id": console_id}
+
+
+def store_rows(count, rng, fake):
+    now = datetime.utcnow()
+    for i in range(count):
+        if i < len(predefined_stores):
+            name, location = predefined_stores[i]["name"], predefined_stores[i]["location"]
+            latitude, longitude = predefined_stores[i]["coordinates"]
+        else:
+            name = f"{fake.company()[:30]} {i}"
+            location = f"{rng.randint(1, 9999)} {fake.street_name()}, {fake.city()}"
+            # Anywhere in the contiguous US
+            latitude, longitude = round(rng.uniform(25, 49), 5), round(rng.uniform(-124, -67), 5)
+        hours = f"{rng.randint(8, 10)}:00-{rng.randint(18, 22)}:00"
+        opens_at, closes_at = opening_minutes(hours)
+        yield {
+            "name": name,
+            "location": location,
+            "hours": hours,
+            "latitude": latitude,
+            "longitude": longitude,
+            "opens_at": opens_at,
+            "closes_at": closes_at,
+            "geohash": encode(latitude, longitude),
+            "updated_at": now,
+        }
+
+
+def listing_rows(count, rng, game_ids, store_ids):
+    now = datetime.utcnow()
+    month = 30 * 24 * 3600
+    for start in range(0, count, BATCH_SIZE):
+        size = min(BATCH_SIZE, count - start)
+        # Draw the foreign keys for the whole batch at once
+        games = rng.choices(game_ids, k=size)
+        stores = rng.choices(store_ids, k=size)
+        for game_id, store_id in zip(games, stores):
+            created_at = now - timedelta(seconds=int(rng.random() * month))
+            yield {
+                "price": round(5 + rng.random() * 55.99, 2),
+                "stock": int(rng.random() * 101),
+                "condition": CONDITIONS[rng.random() < 0.5],
+                "game_id": game_id,
+                "store_id": store_id,
+                "created_at": created_at,
+                "updated_at": created_at,
+                "version": 1,
+            }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Reset and seed the GameNest database")
+    parser.add_argument("--games", type=int, default=len(predefined_games))
+    parser.add_argument("--stores", type=int, default=len(predefined_stores))
+    parser.add_argument("--listings", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=None, help="random seed for repeatable data")
+    return parser.parse_args()
+
 
 if __name__ == '__main__':
+    args = parse_args()
+    rng = random.Random(args.seed)
     fake = Faker()
+    if args.seed is not None:
+        fake.seed_instance(args.seed)
+
     with app.app_context():
         print("Starting seed...")
+        start = time.perf_counter()
 
         db.drop_all()
         db.create_all()
+        connection = db.session.connection()
 
-        predefined_games = [
-            {"title": "Mega Man", "image": "https://upload.wikimedia.org/wikipedia/en/b/bf/Mega_Man_X4_PSX.jpg"},
-            {"title": "Donkey Kong", "image": "https://encrypted-tbn3.gstatic.com/images?q=tbn:ANd9GcSuZ4WZ1W_-MfVFcVHuiXseEXJ5YeW5yQAdEb7BQ4thjhQRqp3FTDo4m8T7wXmodDkYDssk"},
-            {"title": "Rise of the Ronin", "image": "https://image.api.playstation.com/vulcan/ap/rnd/202212/2201/ZfPosZoz1CKZBHTIKUCQRy47.png"},
-            {"title": "Super Smash Bros.", "image": "https://assets.nintendo.com/image/upload/q_auto:best/f_auto/dpr_2.0/ncom/software/switch/70010000012332/ac4d1fc9824876ce756406f0525d50c57ded4b2a666f6dfe40a6ac5c3563fad9"},
-            {"title": "Kingdom Hearts", "image": "https://m.media-amazon.com/images/I/918AUL+i-DL.jpg"},
-            {"title": "Nioh II", "image": "https://image.api.playstation.com/vulcan/img/rnd/202011/0423/P7Sm4r3F8krCQcnN5uqwsS00.png"},
-            {"title": "Elden Ring", "image": "https://image.api.playstation.com/vulcan/ap/rnd/202110/2000/aGhopp3MHppi7kooGE2Dtt8C.png"},
-            {"title": "Dark Souls III", "image": "https://static.bandainamcoent.eu/high/dark-souls/dark-souls-3/00-page-setup/ds3_game-thumbnail.jpg"},
-            {"title": "Pokemon Fallen Thrones", "image": "https://i.imgur.com/VP0VH7E.png"},
-            {"title": "Ninja Gaiden", "image": "https://www.lilithia.net/wp-content/uploads/2021/06/ninjagaidencollection-1576x1182.jpg"},
-            {"title": "The Legend of Zelda: Breath of the Wild", "image": "https://encrypted-tbn3.gstatic.com/images?q=tbn:ANd9GcSO0-bXLKMPSHQECjZUuy4gbwdgmF-7sfhHQ0b59Q2nv8ZZiBzgHEu5mwDuVLBPf71rkB_zQA"},
-            {"title": "Grand Theft Auto V", "image": "https://upload.wikimedia.org/wikipedia/en/a/a5/Grand_Theft_Auto_V.png"},
-            {"title": "Cyberpunk", "image": "https://upload.wikimedia.org/wikipedia/en/9/9f/Cyberpunk_2077_box_art.jpg"},
-            {"title": "The Witcher III: Wild Hunt", "image": "https://upload.wikimedia.org/wikipedia/en/0/0c/Witcher_3_cover_art.jpg"}
-        ]
-
-        print("Seeding Games...")
-        for game_data in predefined_games:
-            game = Game(
-                title=game_data["title"],
-                rating=rc(["E", "T", "M"]),
-                console=rc(["PlayStation", "Xbox", "PC", "Nintendo Switch"]),
-                genre=rc(["Action", "Adventure", "RPG", "Strategy", "Shooter"]),
-                image=game_data["image"]
-            )
-            db.session.add(game)
-
-        predefined_stores = [
-            {"name": "GameStop", "location": "640 Camino Del Rio N STE 317A, San Diego, CA 92108"},
-            {"name": "EB Games", "location": "2612 S Shepherd Dr Houston, TX 77098"},
-            {"name": "Best Buy", "location": "3 Mill Creek Dr, Secaucus, NJ 07094"},
-            {"name": "Electronics Boutique", "location": "2589 Walter Green Cmns, Madison, OH 44057"},
-            {"name": "Gaming Odyssey", "location": "1400 Skyline Blvd, Bismarck, ND 58503"},
-        ]
-
-        print("Seeding Stores...")
-        for store_data in predefined_stores:
-            store = Store(
-                name=store_data["name"],
-                location=store_data["location"],
-                hours=f"{randint(8, 10)}:00 - {randint(18, 22)}:00"
-            )
-            db.session.add(store)
-
-        print("Seeding additional random Stores...")
-        for _ in range(5 - len(predefined_stores)):
-            store = Store(
-                name=fake.company(),
-                location=fake.address(),
-                hours=f"{randint(8, 10)}:00 - {randint(18, 22)}:00"
-            )
-            db.session.add(store)
+        print(f"Seeding {args.games} Games...")
+        insert_rows(connection, Genre, ({"name": name} for name in GENRES))
+        genre_ids = connection.execute(select(Genre.id)).scalars().all()
+        insert_rows(connection, Game, game_rows(args.games, rng, genre_ids))
 
-        db.session.commit()
+        print(f"Seeding {args.stores} Stores...")
+        insert_rows(connection, Store, store_rows(args.stores, rng, fake))
 
-        print("Seeding Listings...")
-        for _ in range(20):
-            created_at = fake.date_this_month(before_today=True, after_today=False)
-            listing = Listing(
-                price=round(randint(5, 60) + randint(0, 99) / 100, 2),
-                stock=randint(0, 100),
-                condition=rc(["New", "Used"]),
-                game_id=rc([game.id for game in Game.query.all()]),
-                store_id=rc([store.id for store in Store.query.all()]),
-                created_at=created_at
-            )
-            db.session.add(listing)
+        # Fetch the ids once instead of querying inside the listing loop
+        game_ids = connection.execute(select(Game.id)).scalars().all()
+        store_ids = connection.execute(select(Store.id)).scalars().all()
+        insert_rows(connection, GameConsole, console_rows(game_ids, rng))
 
-        db.session.commit()
+        # Building the listing indexes once after the load is much cheaper
+        # than updating them on every insert
+        print(f"Seeding {args.listings} Listings...")
+        for index in Listing.__table__.indexes:
+            index.drop(connection)
+        insert_rows(connection, Listing, listing_rows(args.listings, rng, game_ids, store_ids))
+        for index in Listing.__table__.indexes:
+            index.create(connection)
+
+        # Rows went in through Core, so rebuild what the ORM hooks would maintain
+        print("Rebuilding search index, summaries and price history...")
+        rebuild_search_index(connection)
+        refresh_summaries(connection)
+        record_points(connection)
 
-        print("Seeding complete!")
\ No newline at end of file
+        db.session.commit()
+        print(f"Seeding complete in {time.perf_counter() - start:.1f}s!")
@@ -0,0 +1,55 @@
+from operator import attrgetter
+
+from sqlalchemy import DateTime, inspect
+
+from models import Game, Store, Listing
+
+# Same format sqlalchemy_serializer uses for datetimes
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def compile_serializer(model, nested=None, exclude=(), extra=()):
+    # Resolve the column list once, instead of walking rules on every row.
+    # extra names plain attributes/properties to add to the columns.
+    columns = [attr for attr in inspect(model).column_attrs if attr.key not in exclude]
+    datetimes = [attr.key for attr in columns if isinstance(attr.columns[0].type, DateTime)]
+    plain = [attr.key for attr in columns if attr.key not in datetimes] + list(extra)
+    get_plain = attrgetter(*plain)
+    nested = list((nested or {}).items())
+
+    def serialize(obj):
+        data = dict(zip(plain, get_plain(obj)))
+        for key in datetimes:
+            value = getattr(obj, key)
+            data[key] = value.strftime(DATETIME_FORMAT) if value is not None else None
+        for key, serialize_child in nested:
+            child = getattr(obj, key)
+            data[key] = serialize_child(child) if child is not None else None
+        return data
+
+    return serialize
+
+
+# Shapes match to_dict(rules=("-listings",)) for games and stores and
+# Listing.to_dict() (with its nested game and store) for listings
+game_to_dict = compile_serializer(Game, exclude=("genre_id",), extra=("console", "genre"))
+store_to_dict = compile_serializer(Store, exclude=("opens_at", "closes_at", "geohash"))
+listing_to_dict = compile_serializer(Listing, {"game": game_to_dict, "store": store_to_dict})
+
+# Listings with only game_id and store_id, for /listings?include=
+listing_row_to_dict = compile_serializer(Listing)
+
+fast_serializers = {
+    Game: game_to_dict,
+    Store: store_to_dict,
+    Listing: listing_to_dict,
+}
+
+mixin_serializers = {
+    Game: lambda game: game.to_dict(rules=("-listings",)),
+    Store: lambda store: store.to_dict(rules=("-listings",)),
+    Listing: lambda listing: listing.to_dict(),
+}
+
+fast_row_serializers = {Listing: listing_row_to_dict}
+mixin_row_serializers = {Listing: lambda listing: listing.to_dict(rules=("-game", "-store"))}
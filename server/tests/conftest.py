@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import event, insert
+
+# The server modules import each other by their flat names
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import db
+from models import Game, Store, Listing
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A fresh SQLite file per test, with the same pragmas and listeners as
+    # the real database
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def catalog(app):
+    # add(listings=n) creates a game and a store (once) and n listings for them
+    games, stores = [], []
+
+    def add(listings=0, price=19.99, **values):
+        if not games:
+            games.append(Game(title="Test Game", rating="E", console="PC", genre="RPG", image="x"))
+            stores.append(Store(name="Test Store", location="1 Main St", hours="9:00 - 18:00"))
+            db.session.add_all(games + stores)
+            db.session.commit()
+        rows = [
+            {"price": price, "stock": 10, "condition": "New", "game_id": games[0].id, "store_id": stores[0].id, **values}
+            for _ in range(listings)
+        ]
+        ids = db.session.scalars(insert(Listing).returning(Listing.id), rows).all() if rows else []
+        db.session.commit()
+        db.session.remove()
+        return ids
+
+    add.games, add.stores = games, stores
+    return add
+
+
+@pytest.fixture
+def statements(app):
+    # Every SQL statement sent while the test runs
+    sent = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        sent.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    yield sent
+    event.remove(db.engine, "before_cursor_execute", record)
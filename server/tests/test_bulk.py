@@ -0,0 +1,31 @@
+def test_bulk_delete_ignores_boolean_ids(client, catalog):
+    ids = catalog(listings=2)
+    response = client.delete("/listings/bulk?atomic=false", json=[True, False])
+    assert response.status_code == 200
+    assert response.get_json()["deleted"] == []
+    assert all(client.get(f"/listings/{id}").status_code == 200 for id in ids)
+
+
+def test_bulk_patch_ignores_boolean_ids(client, catalog):
+    id = catalog(listings=1)[0]
+    response = client.patch("/listings/bulk", json=[{"id": True, "price": 1}])
+    assert response.status_code == 400
+    assert client.get(f"/listings/{id}").get_json()["price"] == 19.99
+
+
+def test_bulk_post_rejects_boolean_parent_ids(client, catalog):
+    catalog()
+    item = {"price": 5, "stock": 1, "condition": "New", "game_id": True, "store_id": catalog.stores[0].id}
+    response = client.post("/listings/bulk", json=[item])
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == [{"index": 0, "error": "game_id must be a positive integer"}]
+
+
+def test_bulk_post_rejects_items_that_are_not_objects(client, catalog):
+    catalog()
+    response = client.post("/listings/bulk", json=[1, "x"])
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == [
+        {"index": 0, "error": "Each item must be a JSON object."},
+        {"index": 1, "error": "Each item must be a JSON object."},
+    ]
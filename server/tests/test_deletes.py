@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import func, select
+
+from config import db
+from models import Game, Store, Listing, PriceHistory
+
+
+def count(query):
+    return db.session.scalar(select(func.count()).select_from(query.subquery()))
+
+
+@pytest.mark.parametrize("path, parent, column", [
+    ("/games", lambda n: Game(title=f"Game {n}", rating="E", console="PC", genre="RPG", image="x"), "game_id"),
+    ("/stores", lambda n: Store(name=f"Store {n}", location=f"{n} Main St", hours="9:00 - 17:00"), "store_id"),
+])
+def test_delete_sends_the_same_statements_however_many_listings(client, catalog, statements, path, parent, column):
+    catalog()
+    sent = []
+    for rows in (1, 200):
+        obj = parent(rows)
+        db.session.add(obj)
+        db.session.commit()
+        id = obj.id
+        catalog(listings=rows, **{column: id})
+
+        del statements[:]
+        assert client.delete(f"{path}/{id}").status_code == 204
+        sent.append(len(statements))
+        assert count(select(Listing).where(getattr(Listing, column) == id)) == 0
+
+    assert sent[0] == sent[1]
+    assert count(select(PriceHistory).where(PriceHistory.listing_id.not_in(select(Listing.id)))) == 0
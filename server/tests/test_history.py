@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+import history
+from config import db
+from history import compact_history
+from models import PriceHistory
+
+
+def test_compaction_refreshes_cached_history(client, catalog):
+    listing_id = catalog(listings=1)[0]
+    old = datetime.utcnow() - timedelta(days=60)
+    db.session.execute(insert(PriceHistory), [
+        {"listing_id": listing_id, "ts": old + timedelta(hours=hour), "price": 10 + hour, "stock": 5}
+        for hour in range(4)
+    ])
+    db.session.commit()
+
+    path = f"/listings/{listing_id}/history?days=365"
+    before = client.get(path)
+    assert len(before.get_json()["points"]) == 5
+
+    compact_history(db.session, 30, 365)
+    db.session.commit()
+
+    after = client.get(path)
+    assert len(after.get_json()["points"]) == 2
+    assert after.headers["ETag"] != before.headers["ETag"]
+
+
+def test_writes_with_the_same_timestamp_keep_the_last_point(client, catalog, monkeypatch):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime(2026, 1, 1, 12, 0, 0)
+
+    listing_id = catalog(listings=1)[0]
+    monkeypatch.setattr(history, "datetime", FrozenDatetime)
+    for price in (20, 21):
+        assert client.patch(f"/listings/{listing_id}", json={"price": price}).status_code == 202
+
+    points = db.session.execute(select(PriceHistory.ts, PriceHistory.price).where(PriceHistory.listing_id == listing_id))
+    assert (datetime(2026, 1, 1, 12, 0, 0), 21) in points.all()
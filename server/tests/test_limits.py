@@ -0,0 +1,57 @@
+import random
+import threading
+import time
+
+from app import create_app
+from config import db
+
+# Generous, so a slow CI machine passes; without the gate accepted writes
+# queue behind each other for much longer
+P99_BUDGET_SECONDS = 1.0
+
+
+def test_limits_are_off_by_default(app):
+    assert app.config["RATE_LIMIT_READS"] == 0
+    assert app.config["RATE_LIMIT_WRITES"] == 0
+    assert app.extensions["admission_gate"] is None
+
+
+def test_admission_gate_bounds_write_latency(app, catalog):
+    # Many more writers than the gate admits: the excess is refused with 503
+    # instead of queueing, so accepted requests stay fast
+    ids = catalog(listings=20)
+    gated = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": app.config["SQLALCHEMY_DATABASE_URI"],
+        "ADMISSION_MAX_WRITES": 2,
+        "ADMISSION_MAX_QUEUE": 2,
+        "ADMISSION_TIMEOUT": 0.2,
+    })
+    stop = threading.Event()
+    results = []
+
+    def worker(i, write):
+        rng = random.Random(i)
+        client = gated.test_client()
+        while not stop.is_set():
+            path = f"/listings/{rng.choice(ids)}"
+            start = time.perf_counter()
+            if write:
+                status = client.patch(path, json={"price": round(rng.uniform(5, 60), 2)}).status_code
+            else:
+                status = client.get(path).status_code
+            results.append((status, time.perf_counter() - start))
+
+    threads = [threading.Thread(target=worker, args=(i, i >= 2)) for i in range(24)]
+    for thread in threads:
+        thread.start()
+    time.sleep(2)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    with gated.app_context():
+        db.engine.dispose()
+
+    accepted = sorted(elapsed for status, elapsed in results if status < 300)
+    assert accepted and any(status == 503 for status, elapsed in results)
+    assert accepted[int(len(accepted) * 0.99)] < P99_BUDGET_SECONDS
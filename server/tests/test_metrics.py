@@ -0,0 +1,15 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from config import db
+
+
+def test_failed_statement_leaves_no_start_time(app):
+    with db.engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM no_such_table"))
+        assert connection.info["statement_start"] == []
+        connection.execute(text("SELECT 1"))
+        assert connection.info["statement_start"] == []
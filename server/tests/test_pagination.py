@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from config import db
+from pagination import encode_cursor
+
+
+def page_through(client, path):
+    ids, cursor = [], None
+    while True:
+        response = client.get(path + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        ids += [listing["id"] for listing in response.get_json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+
+
+def test_rows_sharing_created_at_are_paged_once(client, catalog):
+    ids = catalog(listings=10, created_at=datetime(2026, 1, 1, 12, 0, 0))
+    ids += catalog(listings=5)
+
+    assert sorted(page_through(client, "/listings?limit=3")) == sorted(ids)
+    game_id = catalog.games[0].id
+    assert sorted(page_through(client, f"/listings?game_id={game_id}&limit=3")) == sorted(ids)
+
+
+def test_new_listings_store_microseconds(app, client, catalog):
+    catalog()
+    response = client.post("/listings/bulk", json=[
+        {"price": 5, "stock": 1, "condition": "New", "game_id": catalog.games[0].id, "store_id": catalog.stores[0].id}
+    ] * 3)
+    assert response.status_code == 201
+
+    stored = db.session.scalars(text("SELECT created_at FROM listings")).all()
+    assert all(len(value) == len("2026-01-01 12:00:00.000000") for value in stored)
+
+
+@pytest.mark.parametrize("path, values", [
+    ("/games", [{"a": 1}]),
+    ("/games", ["1"]),
+    ("/stores", [True]),
+    ("/listings", ["2026-01-01T12:00:00", "1"]),
+    ("/listings", [None, 1]),
+])
+def test_cursor_values_must_match_the_column_types(client, catalog, path, values):
+    catalog(listings=1)
+    response = client.get(f"{path}?limit=1&cursor={encode_cursor(values)}")
+    assert response.status_code == 400
+    assert response.get_json() == {"errors": "Invalid cursor."}
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, text
+
+from config import db
+from geo import nearby_query
+from history import trend_query
+from models import Game, Listing, PriceHistory
+from params import filter_games
+
+PAGE = (Listing.created_at, Listing.id)
+SINCE = datetime(2026, 1, 1)
+
+LOOKUPS = {
+    "listings page": lambda: select(Listing).order_by(*PAGE).limit(50),
+    "listings by game": lambda: select(Listing).where(Listing.game_id == 1).order_by(*PAGE).limit(50),
+    "listings by store": lambda: select(Listing).where(Listing.store_id == 1).order_by(*PAGE).limit(50),
+    "games by console": lambda: filter_games(select(Game), {"console": "pc"}),
+    "games by genre": lambda: filter_games(select(Game), {"genre": "rpg"}),
+    "games by rating": lambda: filter_games(select(Game), {"rating": "e"}),
+    "stores nearby": lambda: nearby_query(40.7, -74.0, 25),
+    "stores nearby, open, stocking a game": lambda: nearby_query(40.7, -74.0, 25, 600, 1),
+    "price history of a listing": lambda: select(PriceHistory)
+    .where(PriceHistory.listing_id == 1, PriceHistory.ts >= SINCE).order_by(PriceHistory.ts.desc()).limit(50),
+    "price trend of a game": lambda: trend_query(1, "day", SINCE, "sqlite"),
+}
+
+
+@pytest.mark.parametrize("name", LOOKUPS)
+def test_lookup_uses_an_index(app, name):
+    sql = str(LOOKUPS[name]().compile(db.engine, compile_kwargs={"literal_binds": True}))
+    plan = [row[-1] for row in db.session.execute(text("EXPLAIN QUERY PLAN " + sql))]
+    assert not [step for step in plan if step.startswith("SCAN") and "INDEX" not in step], plan
@@ -0,0 +1,45 @@
+import pytest
+
+from config import db
+from models import Game, Store, Listing
+
+
+def add_listings(n):
+    # Each listing gets its own game and store, so per-row loads can't be
+    # served from the identity map
+    ids = []
+    start = db.session.query(Listing).count()
+    for i in range(start, start + n):
+        game = Game(title=f"Game {i}", rating="E", console="PC", genre="RPG", image="x")
+        store = Store(name=f"Store {i}", location=f"{i + 1} Main St", hours="9:00 - 18:00")
+        listing = Listing(price=19.99, stock=10, condition="New", game=game, store=store)
+        db.session.add(listing)
+        db.session.commit()
+        ids.append(listing.id)
+    db.session.remove()
+    return ids
+
+
+def count_statements(client, statements, path):
+    # Each request uses a fresh path, so it misses the response cache
+    del statements[:]
+    response = client.get(path)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize("include", ["", "&include=game,store"])
+def test_listing_collection_query_count_does_not_grow(client, statements, include):
+    add_listings(1)
+    small = count_statements(client, statements, f"/listings?limit=100{include}")
+    add_listings(49)
+    large = count_statements(client, statements, f"/listings?limit=100&n=50{include}")
+    assert large == small
+
+
+def test_listing_query_count_does_not_grow(client, statements):
+    first = add_listings(1)[0]
+    small = count_statements(client, statements, f"/listings/{first}")
+    last = add_listings(49)[-1]
+    large = count_statements(client, statements, f"/listings/{last}")
+    assert large == small
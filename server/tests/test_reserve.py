@@ -0,0 +1,64 @@
+import random
+import threading
+import time
+
+THREADS = 6
+
+
+def run(app, work):
+    # work(client, count) is called in each thread until it returns False;
+    # returns the counts of every thread added up
+    counts = [{} for _ in range(THREADS)]
+
+    def worker(i):
+        client = app.test_client()
+        while work(client, counts[i]):
+            pass
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    totals = {}
+    for count in counts:
+        for key, value in count.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def test_concurrent_reservations_do_not_oversell(app, client, catalog):
+    path = f"/listings/{catalog(listings=1)[0]}"
+    client.patch(path, json={"stock": 30})
+
+    def reserve(client, count):
+        status = client.post(f"{path}/reserve", json={"quantity": 1}).status_code
+        count[status] = count.get(status, 0) + 1
+        return status == 200
+
+    reserved = run(app, reserve)
+    assert reserved.get(200, 0) == 30
+    assert set(reserved) == {200, 409}
+    assert client.get(path).get_json()["stock"] == 0
+
+
+def test_version_checked_updates_are_not_lost(app, client, catalog):
+    path = f"/listings/{catalog(listings=1)[0]}"
+    client.patch(path, json={"stock": 0})
+    increments = 5
+
+    def increment(client, count):
+        if count.get("done", 0) >= increments:
+            return False
+        current = client.get(path).get_json()
+        response = client.patch(path, json={"stock": current["stock"] + 1, "version": current["version"]})
+        count[response.status_code] = count.get(response.status_code, 0) + 1
+        count["done"] = count.get("done", 0) + (response.status_code == 202)
+        if response.status_code == 409:
+            # Back off like a client would before reloading and retrying
+            time.sleep(random.random() * 0.01)
+        return response.status_code in (202, 409)
+
+    patched = run(app, increment)
+    assert patched[202] == THREADS * increments
+    assert client.get(path).get_json()["stock"] == THREADS * increments
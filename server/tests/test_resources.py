@@ -0,0 +1,46 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import event, func, select
+
+from config import db
+from models import Genre
+
+
+@pytest.mark.parametrize("path, error", [
+    ("/games/999", "Game not found"),
+    ("/stores/999", "Store not found"),
+    ("/listings/999", "Listing not found"),
+])
+def test_missing_id_is_not_found(client, catalog, path, error):
+    catalog(listings=1)
+    for _ in range(2):
+        # The second request would be served from the cache if the 404 were stored
+        response = client.get(path)
+        assert response.status_code == 404
+        assert response.get_json() == {"error": error}
+
+
+def test_new_genre_added_concurrently_is_reused(app, client, monkeypatch):
+    # Another writer commits the same new genre right after this request
+    # looked it up
+    path = db.engine.url.database
+    raced = []
+
+    def other_writer(conn, cursor, statement, parameters, context, executemany):
+        if "FROM genres" in statement and not raced:
+            raced.append(True)
+            with sqlite3.connect(path) as other:
+                other.execute("INSERT INTO genres (name) VALUES ('Roguelike')")
+
+    event.listen(db.engine, "after_cursor_execute", other_writer)
+    try:
+        response = client.post("/games", json={
+            "title": "Dead Cells", "rating": "T", "console": "PC", "genre": "Roguelike", "image": "x",
+        })
+    finally:
+        event.remove(db.engine, "after_cursor_execute", other_writer)
+
+    assert raced and response.status_code == 201
+    assert response.get_json()["genre"] == "Roguelike"
+    assert db.session.scalar(select(func.count()).select_from(Genre)) == 1
@@ -0,0 +1,47 @@
+import pytest
+
+from config import db
+
+
+def search_titles(client, q):
+    return [result["item"].get("title") or result["item"].get("name") for result in client.get(f"/search?q={q}").get_json()]
+
+
+def test_index_follows_renames_and_deletes(client, catalog):
+    catalog()
+    game_id, store_id = catalog.games[0].id, catalog.stores[0].id
+    assert client.patch(f"/games/{game_id}", json={"title": "Renamed Game"}).status_code == 202
+    assert client.patch(f"/stores/{store_id}", json={"name": "Renamed Store"}).status_code == 202
+    assert sorted(search_titles(client, "renamed")) == ["Renamed Game", "Renamed Store"]
+    assert search_titles(client, "test") == []
+
+    assert client.delete(f"/stores/{store_id}").status_code == 204
+    assert search_titles(client, "renamed") == ["Renamed Game"]
+
+
+def test_documents_are_removed_by_rowid(client, catalog, statements):
+    catalog()
+    del statements[:]
+    client.patch(f"/games/{catalog.games[0].id}", json={"title": "Renamed Game"})
+
+    deletes = [statement for statement in statements if statement.startswith("DELETE FROM search_index")]
+    assert deletes
+    for statement in deletes:
+        plan = db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, (None,) * statement.count("?"))
+        # An FTS5 plan with nothing after "INDEX 0:" reads the whole index
+        assert not any(step.endswith("INDEX 0:") for *_, step in plan)
+
+
+@pytest.mark.parametrize("offset, error", [("-1", "offset must not be negative."), ("x", "offset must be an integer.")])
+def test_bad_offset_is_rejected(client, catalog, offset, error):
+    catalog()
+    response = client.get(f"/search?q=test&offset={offset}")
+    assert response.status_code == 400
+    assert response.get_json() == {"errors": error}
+
+
+def test_offset_pages_through_results(client, catalog):
+    catalog()
+    assert len(client.get("/search?q=test&limit=1").get_json()) == 1
+    assert len(client.get("/search?q=test&limit=1&offset=1").get_json()) == 1
+    assert client.get("/search?q=test&limit=1&offset=2").get_json() == []
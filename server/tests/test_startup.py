@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed by CLI commands and seeding; a serving worker shouldn't load them
+CLI_ONLY_MODULES = ("alembic", "flask_migrate", "faker")
+
+# Generous, so a slow CI machine passes but an eager heavy import does not
+BUDGET_SECONDS = 1.5
+
+
+def cold_import(module):
+    # (seconds, top-level packages) for importing module in a fresh interpreter
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(time.perf_counter() - start)\n"
+        "print(' '.join(sorted({name.split('.')[0] for name in sys.modules})))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=SERVER, check=True)
+    seconds, modules = result.stdout.splitlines()[-2:]
+    return float(seconds), set(modules.split())
+
+
+@pytest.mark.parametrize("module", ["app", "asgi"])
+def test_entry_point_skips_cli_only_modules(module):
+    seconds, modules = cold_import(module)
+    assert not modules & set(CLI_ONLY_MODULES)
+
+
+@pytest.mark.parametrize("module", ["app", "asgi"])
+def test_entry_point_imports_within_budget(module):
+    # Best of three, so one slow run on a busy machine doesn't fail it
+    assert min(cold_import(module)[0] for _ in range(3)) < BUDGET_SECONDS
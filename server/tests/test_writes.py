@@ -0,0 +1,48 @@
+import pytest
+
+from config import db
+from models import Game, Listing
+
+
+def game_body(game):
+    return {key: getattr(game, key) for key in ("title", "rating", "console", "genre", "image")}
+
+
+def listing_body(listing):
+    return {key: getattr(listing, key) for key in ("condition", "stock", "price", "game_id", "store_id")}
+
+
+# name: (path, body, statement budget). Loading a game also loads its
+# consoles (one statement); game/store changes rewrite their search index
+# row (two statements); every write appends to the change log (one
+# statement) and a price or stock change to the price history (one)
+PATCHES = {
+    "game, full body unchanged": lambda game, store, listing, other_game: (
+        f"/games/{game.id}", game_body(game), 2),
+    "game, one field": lambda game, store, listing, other_game: (
+        f"/games/{game.id}", {"image": game.image + "?v=2"}, 7),
+    "store, one field": lambda game, store, listing, other_game: (
+        f"/stores/{store.id}", {"name": store.name + "!"}, 6),
+    "listing, price": lambda game, store, listing, other_game: (
+        f"/listings/{listing.id}", {"price": listing.price + 1}, 6),
+    "listing, full body": lambda game, store, listing, other_game: (
+        f"/listings/{listing.id}", {**listing_body(listing), "stock": (listing.stock + 1) % 100}, 6),
+    "listing, new game": lambda game, store, listing, other_game: (
+        f"/listings/{listing.id}", {"game_id": other_game.id}, 7),
+}
+
+
+@pytest.mark.parametrize("name", PATCHES)
+def test_patch_stays_within_statement_budget(client, catalog, statements, name):
+    listing_id = catalog(listings=1)[0]
+    other_game = Game(title="Other Game", rating="T", console="Xbox", genre="Action", image="y")
+    db.session.add(other_game)
+    db.session.commit()
+    listing = db.session.get(Listing, listing_id)
+    path, body, budget = PATCHES[name](listing.game, listing.store, listing, other_game)
+    db.session.remove()
+
+    del statements[:]
+    response = client.patch(path, json=body)
+    assert response.status_code == 202
+    assert len(statements) <= budget, "\n".join(" ".join(statement.split()) for statement in statements)
@@ -0,0 +1,83 @@
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import request, make_response, Response
+from sqlalchemy import event, insert, select, update
+
+from config import db
+from models import TableVersion
+
+VERSIONED_TABLES = ("games", "stores", "listings")
+
+
+@event.listens_for(TableVersion.__table__, "after_create")
+def seed_versions(table, connection, **kw):
+    connection.execute(insert(table), [{"table_name": name, "version": 0} for name in VERSIONED_TABLES])
+
+
+def bump_versions(connection, tables):
+    connection.execute(
+        update(TableVersion)
+        .where(TableVersion.table_name.in_(sorted(tables)))
+        .values(version=TableVersion.version + 1, updated_at=datetime.utcnow())
+    )
+
+
+@event.listens_for(db.session, "after_flush")
+def bump_flushed_tables(session, flush_context):
+    # new/dirty/deleted still hold the pre-flush state here
+    objects = list(session.new) + list(session.dirty) + list(session.deleted)
+    tables = {getattr(obj, "__tablename__", None) for obj in objects} & set(VERSIONED_TABLES)
+    if tables:
+        bump_versions(session.connection(), tables)
+
+
+@event.listens_for(db.session, "do_orm_execute")
+def bump_bulk_tables(orm_execute_state):
+    # ORM bulk insert/update/delete statements skip the flush, so bump here
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.local_table.name in VERSIONED_TABLES:
+        bump_versions(orm_execute_state.session.connection(), {mapper.local_table.name})
+
+
+def table_versions(tables):
+    rows = db.session.execute(
+        select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.table_name.in_(tables))
+    )
+    return {name: (version, updated_at) for name, version, updated_at in rows}
+
+
+def conditional(*tables):
+    # Weak ETag / Last-Modified derived from the table versions, so unchanged
+    # data answers 304 before any row is loaded or serialized
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            versions = table_versions(tables)
+            etag = ".".join(str(versions.get(name, (0, None))[0]) for name in tables)
+            modified = [updated_at for version, updated_at in versions.values() if updated_at]
+            last_modified = max(modified).replace(microsecond=0, tzinfo=timezone.utc) if modified else None
+
+            if request.if_none_match:
+                if request.if_none_match.contains_weak(etag):
+                    return not_modified(etag, last_modified)
+            elif request.if_modified_since and last_modified and last_modified <= request.if_modified_since:
+                return not_modified(etag, last_modified)
+
+            response = fn(*args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                response.set_etag(etag, weak=True)
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
+
+
+def not_modified(etag, last_modified):
+    response = make_response("", 304)
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    return response